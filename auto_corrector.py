@@ -2,7 +2,8 @@ import re
 import os
 import logging
 import json
-from copy import deepcopy
+from functools import lru_cache
+from corpus_matcher import PhraseMatcher, ContentIndex
 
 LT_MESSAGES = ["(s'ha arribat al límit de suggeriments)",
                "(suggestion limit reached)",
@@ -60,13 +61,29 @@ class AutoCorrector(object):
         self.offline = None
         # corpus initialized from outer scope
         self.corpus = set()
-        # known translations
-        with open(os.path.join(PATH,'db/manual_corrections.json')) as mc:
-            self.manual_corrections = json.load(mc)
+        # multi-word names protected as a whole, the global ones are
+        # shared by all the pages and the local ones change per page
+        self.phrases = PhraseMatcher()
+        self.local_phrases = PhraseMatcher()
+        # corrections implemented in the last auto_correct call
+        self.edits = []
+        # known translations, shared read-only by all the correctors
+        self.manual_corrections = get_manual_corrections()
 
     def auto_correct(self, response, scope='full'):
+        # returns the corrected content, the implemented corrections are
+        # left in self.edits
+        self.edits = self.get_edits(response)
+        return apply_edits(self.content, self.edits)
+
+    def get_edits(self, response):
+        # returns the accepted corrections of the response as a list of
+        # non-overlapping edits sorted by offset
         self.content = response['content']
-        new_content = deepcopy(self.content)
+        self.content_index = None
+        # spans of the content occupied by known multi-word names
+        protected = self.phrases.spans(self.content)
+        protected.update(self.local_phrases.find(self.content))
         # detect response format: online vs offline
         if response['response'].get('language'):
             self.offline = False
@@ -76,7 +93,7 @@ class AutoCorrector(object):
             # get language list and convert from langdetect to LanguageTool codes
             languages = [LANG_KEYS[lang] for lang in response['languages']]
 
-        difference = 0
+        edits = []
         # since rule ids are unique per language dict can be flattened
         correction_stop_categories_lang = \
                 [value for ls in self.correction_stop_categories.values() \
@@ -117,6 +134,7 @@ class AutoCorrector(object):
                     pass
                 else:
                     if target.lower() in self.corpus or\
+                       protected.overlaps(i_start, i_end) or\
                        target.isupper() or\
                        (target[0].isupper() and len(target.split())==1) or\
                        category in correction_stop_categories_lang:
@@ -126,27 +144,33 @@ class AutoCorrector(object):
                             replacement =\
                               self.manual_corrections[language][target.lower()]
                             replace = True
+                            reason = 'manual'
                             info = ' '.join(['m', category, target, replacement])
                             logging.info(info)
                         elif len(match['replacements']) == 1:
                                 replace = True
+                                reason = 'single'
                                 info = ' '.join([category, target, replacement])
                                 logging.info(info)
                         elif len(match['replacements']) > 1:
                                 replace = True
+                                reason = 'top'
                                 alt_replacement = self.get_replacement(target,
                                                             match['replacements'])
                                 if alt_replacement:
                                     replacement = alt_replacement
+                                    reason = 'alternative'
                                 info = ' '.join(['>', category,
                                                  target, replacement])
                                 logging.info(info)
                     if replace:
-                        new_content = new_content[:i_start+difference]+\
-                                      replacement+\
-                                      new_content[i_end+difference:]
-                        difference += len(replacement)-len(target)
-        return new_content
+                        edits.append({'offset': i_start,
+                                      'length': i_end-i_start,
+                                      'original': target,
+                                      'replacement': replacement,
+                                      'rule': category,
+                                      'reason': reason})
+        return resolve_overlaps(edits)
 
     def get_replacement(self, target, matches):
         if self.offline == True:
@@ -154,7 +178,9 @@ class AutoCorrector(object):
         else:
             replacements = [m['value'] for m in matches]
         replacement = None
-        if re.search('\s%s\s'%replacements[0], self.content, re.IGNORECASE):
+        if self.content_index is None:
+            self.content_index = ContentIndex(self.content)
+        if replacements[0] in self.content_index:
             top_in_corpus = True
         else:
             top_in_corpus = False
@@ -164,7 +190,7 @@ class AutoCorrector(object):
             if RE_SPACES.sub('', target) == RE_SPACES.sub('', possible_repl):
                 replacement_in_corpus = True
                 for token in possible_repl.split():
-                    if not re.search('\s%s\s'%token, self.content, re.IGNORECASE):
+                    if token not in self.content_index:
                         replacement_in_corpus = False
                 possible_replacements.append((possible_repl,
                                               replacement_in_corpus))
@@ -189,3 +215,35 @@ class AutoCorrector(object):
                 # use top replacement (i.e. return none)
                 pass
         return replacement
+
+@lru_cache(maxsize=None)
+def get_manual_corrections():
+    # loaded once per process
+    with open(os.path.join(PATH,'db/manual_corrections.json')) as mc:
+        return json.load(mc)
+
+def resolve_overlaps(edits):
+    # sorts the edits and drops the ones overlapping a previous edit
+    resolved = []
+    end = 0
+    for edit in sorted(edits, key=lambda e: (e['offset'], e['length'])):
+        if resolved and edit['offset'] < end:
+            msg = 'overlapping correction dropped: %s %s -> %s, kept %s -> %s'\
+                  ''%(edit['rule'], edit['original'], edit['replacement'],
+                      resolved[-1]['original'], resolved[-1]['replacement'])
+            logging.info(msg)
+            continue
+        resolved.append(edit)
+        end = edit['offset']+edit['length']
+    return resolved
+
+def apply_edits(content, edits):
+    # applies sorted non-overlapping edits in a single pass
+    parts = []
+    position = 0
+    for edit in edits:
+        parts.append(content[position:edit['offset']])
+        parts.append(edit['replacement'])
+        position = edit['offset']+edit['length']
+    parts.append(content[position:])
+    return ''.join(parts)
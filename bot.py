@@ -1,19 +1,30 @@
-import sys
 import os
 import re
 import json
 import time
-import hashlib
 import logging
+import threading
 import argparse
 import pywikibot
 import mwparserfromhell
+import chunker
 import corrector
+import corpus_snapshot
 
+from copy import copy
+from urllib.parse import urlencode
+from collections import OrderedDict
 from pywikibot import pagegenerators
-from pylanguagetool import api
 from auto_corrector import AutoCorrector
-from corpora_utils import get_global_corpora, cache_filepath, clean_token
+from corpora_utils import get_global_corpora, refresh_global_corpora,\
+                          cache_filepath, get_corpus_tokens
+from pipeline import Pipeline
+from preloader import Preloader
+from page_edit import PageEdit
+from corpus_matcher import PhraseMatcher, LayeredCorpus
+from correction_cache import CorrectionCache
+from correction_store import CorrectionStore
+from lt_scheduler import Scheduler
 
 LT_URL = 'https://languagetool.org/api/v2/'
 RE_LANGS = {'ca-ES': re.compile('^(catal|ca-)'),
@@ -21,37 +32,160 @@ RE_LANGS = {'ca-ES': re.compile('^(catal|ca-)'),
             'en-US': re.compile('^(en|ing|ang)'),
             'fr': re.compile('^fr')}
 HOSTS = ['teixidora', 'localhost', 'dadess']
+# utf8 bytes per online LanguageTool request
+REQUEST_SIZE_LIMIT = 6000
 STOP_TOKENS = set(['es', 'la', 'el', 'a', 'dona', 'i', 'y'])
 PATH = os.path.abspath(os.path.dirname(__file__))
+# template parameters of the last visited page revisions
+TEMPLATE_CACHE = OrderedDict()
+TEMPLATE_CACHE_SIZE = 1000
+TEMPLATE_CACHE_LOCK = threading.Lock()
+# recent changes kept by the wiki and overlap between consecutive runs
+RC_MAX_AGE = 90*24*3600 # seconds
+RC_MARGIN = 600 # seconds
+REFRESH_INTERVAL = 24*3600 # seconds
 
 def main(args):
-    c_bot = Bot('bot_corrector', host=args.host)
+    c_bot = Bot('bot_corrector', host=args.host,
+                languagetool=args.languagetool or LT_URL)
+    c_bot.incremental = not args.full
+    # the given LanguageTool servers are only used by online corrections
+    c_bot.online = args.online or bool(args.languagetool)
+    c_bot.keep_original = args.keep_original
+    if args.refresh is not None:
+        c_bot.refresh_interval = args.refresh*3600
+    c_bot.refresh_global_corpus()
 
     count = 0
     if args.page:
         correct_or_publish(c_bot, args.page)
+        c_bot.correction_cache.flush()
     elif args.all:
         count = 0
-        for page in page_generator(c_bot.site):
-            correct_or_publish(c_bot, page)
+        run_id = c_bot.store.start_run()
+        c_bot.preloader = Preloader(c_bot.site)
+        c_bot.asynchronous = True
+        pages = c_bot.preloader.preload(page_generator(c_bot.site,
+                                                       c_bot.store,
+                                                       args.full))
+        pages = refreshing(c_bot, pages)
+        errors = 0
+        if args.workers > 1:
+            stages = [('fetch', lambda page: fetch_page(c_bot, page)),
+                      ('correct', correct_page),
+                      ('publish', publish_page)]
+            pipeline = Pipeline(stages, workers=args.workers)
+            pipeline.run(pages)
+            errors = sum(pipeline.errors.values())
+        else:
+            for page in pages:
+                correct_or_publish(c_bot, page)
+        # the run is finished once the queued saves are done, and only
+        # if no page failed. otherwise the next run visits again the pages
+        # changed since the last finished run, and the failed ones with them
+        pywikibot.stopme()
+        errors += len(c_bot.save_errors)
+        c_bot.correction_cache.flush()
+        if errors:
+            msg = '%i pages failed, the run is not marked as finished'%errors
+            logging.warning(msg)
+        else:
+            c_bot.store.finish_run(run_id)
 
-def page_generator(site):
+def page_generator(site, store=None, full=False):
     category = pywikibot.Category(site, 'Esdeveniments')
-    return pagegenerators.CategorizedPageGenerator(category)
+    pages = pagegenerators.CategorizedPageGenerator(category)
+    if store is None or full:
+        return pages
+    # only the pages edited since the last finished run need a visit
+    since = store.get_last_run()
+    if since is None or time.time()-since > RC_MAX_AGE:
+        logging.info('no recent run found, visiting all the pages')
+        return pages
+    changed = get_changed_revisions(site, since-RC_MARGIN)
+    msg = '%i pages changed since the last run'%len(changed)
+    logging.info(msg)
+    return (page for page in pages\
+            if page.title() in changed and\
+               changed[page.title()] != store.get_revision(page.title()))
+
+def get_changed_revisions(site, since):
+    # title -> last revision of the pages edited after the since timestamp
+    changed = {}
+    start = pywikibot.Timestamp.utcfromtimestamp(since)
+    for change in site.recentchanges(start=start, reverse=True):
+        if change.get('title') and change.get('revid'):
+            changed[change['title']] = change['revid']
+    return changed
 
 def correct_or_publish(c_bot, page):
     c_bot.get_page(page)
+    if c_bot.is_processed():
+        return
+    action = get_action(c_bot)
+    saved = False
+    if action == 'correct':
+        msg = 'correcting %s'%c_bot.title
+        logging.info(msg)
+        c_bot.correct_notes()
+        c_bot.implement_corrections()
+        saved = c_bot.send_corrections()
+    elif action == 'publish':
+        saved = c_bot.replace_corrected_notes()
+    # the saved pages are checkpointed when their save succeeds
+    if not saved:
+        c_bot.checkpoint()
+
+def get_action(c_bot):
+    # decides what to do with the page loaded in the bot according to
+    # the status parameters of the event template
     if c_bot.params["bot import"] == 'Fet':
         if c_bot.params["bot correction"] == 'Activar':
-            msg = 'correcting %s with cache %s'%(c_bot.title,
-                                                 c_bot.outname)
-            logging.info(msg)
-            c_bot.correct_notes()
-            c_bot.implement_corrections()
-            c_bot.send_corrections()
+            return 'correct'
         elif c_bot.params["bot correction"] == "Feta" and\
              c_bot.params["human review"] == "Feta":
-            c_bot.replace_corrected_notes()
+            return 'publish'
+    return None
+
+def refreshing(c_bot, pages):
+    # refreshes the global corpus when due between the pages of long runs
+    for page in pages:
+        c_bot.refresh_global_corpus()
+        yield page
+
+# stages of the concurrent pipeline. every page gets its own spawned bot
+# which travels through the stages together with the action to take
+def fetch_page(c_bot, page):
+    p_bot = c_bot.spawn()
+    p_bot.get_page(page)
+    if p_bot.is_processed():
+        return None
+    action = get_action(p_bot)
+    if not action:
+        p_bot.checkpoint()
+        return None
+    p_bot.get_note_titles()
+    return p_bot, action
+
+def correct_page(item):
+    p_bot, action = item
+    if action == 'correct':
+        msg = 'correcting %s'%p_bot.title
+        logging.info(msg)
+        p_bot.correct_notes()
+        p_bot.implement_corrections()
+    return item
+
+def publish_page(item):
+    p_bot, action = item
+    saved = False
+    if action == 'correct':
+        saved = p_bot.send_corrections()
+    elif action == 'publish':
+        saved = p_bot.replace_corrected_notes()
+    if not saved:
+        p_bot.checkpoint()
+    return item
 
 class Bot(object):
     def __init__(self, botname, host = 'teixidora', languagetool = LT_URL):
@@ -62,36 +196,86 @@ class Bot(object):
             raise ValueError(msg)
         self.site = pywikibot.Site('ca', host)
         self.botname = botname
-        self.languagetool = LT_URL
+        # a url or a list of urls of LanguageTool servers
+        self.languagetool = languagetool
+        # correct with the LanguageTool api instead of the local engines
         self.online = False
+        # skip the pages whose revision was already processed
+        self.incremental = True
+        # batched loader of the wiki pages, see preloader.py
+        self.preloader = None
+        # queue the saves in the background instead of waiting for them
+        self.asynchronous = False
+        # save the original content as a revision of the correction page
+        self.keep_original = False
+        # titles of the failed saves, shared with the spawned bots
+        self.save_errors = []
         self.params = {"bot import": None, 
                        "bot correction": None,
                        "human review": None}
-        self.outname = None
         self.declared_language = None
         self.local_corpus = set()
+        self.notes = []
+        self.note_pages = {}
+        # seconds between the refreshes of the global corpus, 0 disables them
+        self.refresh_interval = REFRESH_INTERVAL
         self.get_global_corpus()
         self.auto_corrector = AutoCorrector()
+        self.auto_corrector.phrases = self.global_phrases
+        self.correction_cache = CorrectionCache()
+        self.store = CorrectionStore()
+
+    def spawn(self):
+        # returns a bot that shares the site, the global corpus and the
+        # configuration with this one but keeps its own per page state
+        # (page, notes, corrections...), so that several pages can be
+        # processed at the same time
+        bot = copy(self)
+        bot.auto_corrector = copy(self.auto_corrector)
+        bot.params = {"bot import": None,
+                      "bot correction": None,
+                      "human review": None}
+        bot.declared_language = None
+        bot.local_corpus = set()
+        bot.notes = []
+        bot.note_pages = {}
+        return bot
 
     def get_global_corpus(self):
         # TODO better file path handling
         if not os.path.exists(cache_filepath):
-            global_corpus_dict = get_global_corpora(self.site)
-        else:
+            get_global_corpora(self.site)
+        # tokens and phrases are read from the compiled snapshot of the
+        # corpora, see corpus_snapshot.py
+        snapshot = corpus_snapshot.load(cache_filepath)
+        self.global_corpus = LayeredCorpus([snapshot.tokens])
+        self.global_phrase_list = snapshot.phrases
+        # multi-word names are also protected as phrases
+        self.global_phrases = snapshot.get_phrase_matcher()
+        self.last_refresh = snapshot.updated or 0
+
+    def refresh_global_corpus(self):
+        # adds the names of the events modified since the last refresh.
+        # the corpus is replaced, not modified, since spawned bots may be
+        # reading it
+        if not self.refresh_interval or\
+           time.time() < self.last_refresh+self.refresh_interval:
+            return
+        self.last_refresh = time.time()
+        try:
             with open(cache_filepath) as cf:
                 global_corpus_dict = json.load(cf)
-
-        tokens = []
-        for key, name_list in global_corpus_dict.items():
-            if key not in ['exists', 'stop_words']:
-                for name in name_list:
-                    tokens += [clean_token(n.lower()) for n in name.split()]
-            elif key == 'stop_words':
-                # stop words can be compound
-                for name in name_list:
-                    tokens += [name.lower()]
-        # convert list to set eliminating the empty strings
-        self.global_corpus = set([token for token in tokens if token])
+            new_names = refresh_global_corpora(self.site, global_corpus_dict)
+        except (pywikibot.Error, ValueError) as e:
+            msg = 'global corpus not refreshed: %s'%e
+            logging.warning(msg)
+            return
+        tokens, phrases = get_corpus_tokens(new_names)
+        self.global_corpus = self.global_corpus.add_layer(frozenset(tokens))
+        if phrases:
+            self.global_phrase_list = list(self.global_phrase_list)+phrases
+            self.global_phrases = PhraseMatcher(self.global_phrase_list)
+            self.auto_corrector.phrases = self.global_phrases
 
     def get_page(self, title_or_page):
         # get a new teixidora page initializing the rest of the variables
@@ -106,19 +290,19 @@ class Bot(object):
             msg = "%s does not exist or not reachable"%title_or_page
             logging.warning(msg)
             #raise ValueError(msg)
-        self.wikicode = mwparserfromhell.parse(self.page.text)
+        # parsed on demand, the template parameters of a known revision
+        # come from the cache without parsing the page
+        self._wikicode = None
+
+        # index the template parameters once for all the lookups below
+        self.get_template_params()
 
         # get bot correction and human review parameters
         self.get_correction_status()
 
-        # get cache out file hash
-        # TODO push to a db and use hash as the key
-        h = hashlib.md5(self.title.encode('utf8'))
-        self.outname = h.hexdigest()+'.json'
-        self.outpath = os.path.join(PATH, 'cache/'+self.outname)
-
         # clean the notes and corrected notes objects if they were full
         self.notes = []
+        self.note_pages = {}
         self.corrected_notes = {}
 
         # get declared language
@@ -126,8 +310,69 @@ class Bot(object):
 
         # get mentioned elements from semantic fields
         self.get_local_corpus()
-        corpus = self.local_corpus.union(self.global_corpus)
-        self.auto_corrector.corpus = corpus.difference(STOP_TOKENS)
+        self.auto_corrector.corpus = LayeredCorpus([self.local_corpus,
+                                                    self.global_corpus],
+                                                   STOP_TOKENS)
+
+    @property
+    def wikicode(self):
+        if getattr(self, '_wikicode', None) is None:
+            self._wikicode = mwparserfromhell.parse(self.page.text)
+        return self._wikicode
+
+    def get_revision(self):
+        try:
+            return self.page.latest_revision_id
+        except Exception:
+            return None
+
+    def is_processed(self):
+        # whether the current revision of the page was already processed
+        if not self.incremental:
+            return False
+        revision = self.get_revision()
+        if revision and revision == self.store.get_revision(self.title):
+            logging.debug('%s already processed, skipping'%self.title)
+            return True
+        return False
+
+    def checkpoint(self):
+        # stores the revision of the page after processing it, including
+        # the edits of the bot itself
+        revision = self.get_revision()
+        if revision:
+            self.store.set_revision(self.title, revision)
+
+    def get_template_params(self):
+        # a single pass over the templates builds template name ->
+        # parameter name -> value and parameter name -> values in page
+        # order. both are cached per revision of the page
+        revision = self.get_revision()
+        key = (self.title, revision) if revision else None
+        with TEMPLATE_CACHE_LOCK:
+            cached = TEMPLATE_CACHE.get(key) if key else None
+            if cached:
+                TEMPLATE_CACHE.move_to_end(key)
+        if cached:
+            self.templates, self.template_params = cached
+            return
+
+        self.templates = OrderedDict()
+        self.template_params = {}
+        for template in self.wikicode.filter_templates():
+            name = str(template.name).strip()
+            values = self.templates.setdefault(name, OrderedDict())
+            for param in template.params:
+                param_name = str(param.name).strip()
+                value = str(param.value)
+                values[param_name] = value
+                self.template_params.setdefault(param_name, []).append(value)
+
+        if key:
+            with TEMPLATE_CACHE_LOCK:
+                TEMPLATE_CACHE[key] = (self.templates, self.template_params)
+                while len(TEMPLATE_CACHE) > TEMPLATE_CACHE_SIZE:
+                    TEMPLATE_CACHE.popitem(last=False)
 
     def get_correction_status(self):
         # for each page the parameters should be "resetted"
@@ -135,22 +380,18 @@ class Bot(object):
                        "bot correction": None,
                        "human review": None}
 
-        for template in self.wikicode.filter_templates():
-            for param in template.params:
-                for key in self.params.keys():
-                    if param.startswith(key):
-                        i = len(key)+1
-                        self.params[key] = param[i:].strip()
+        for key in self.params.keys():
+            values = self.template_params.get(key)
+            if values:
+                self.params[key] = values[-1].strip()
 
     def get_declared_language(self):
         lan_param = 'language'
         language = None
-        for template in self.wikicode.filter_templates():
-            for param in template.params:
-                if param.startswith(lan_param):
-                    language = template.get(lan_param)[len(lan_param)+1:]\
-                                       .lower()
-                    break
+        self.declared_language = None
+        values = self.template_params.get(lan_param)
+        if values:
+            language = values[-1].strip().lower()
         # convert language to language code due to non-standard language
         # naming convenion
         if language:
@@ -171,26 +412,27 @@ class Bot(object):
         fields = ['projects mentioned', 'keywords', 'organizer',
                   'organizations mentioned', 'speakers',
                   'keywords in English', 'individuals mentioned']
+        phrases = []
+        self.local_corpus = set()
         for field in fields:
-            for template in self.wikicode.filter_templates():
-                for param in template.params:
-                    if param.startswith('%s='%field):
-                        # we are interested in tokens not concepts hence
-                        # we first get rid of the commas and then split
-                        f_elements = template.get(field)
-                        if f_elements:
-                            elements_str = f_elements[len(field)+1:]\
-                                                    .replace(',','')
-                            elements = set(elements_str.strip().lower().split())
-                            self.local_corpus = self.local_corpus.union(elements)
-                            break
+            for value in self.template_params.get(field, []):
+                # we are interested in tokens not concepts hence
+                # we first get rid of the commas and then split
+                elements_str = value.replace(',','')
+                self.local_corpus.update(elements_str.strip().lower().split())
+                # but the concepts with several words are kept as phrases
+                phrases += [concept for concept in value.split(',')\
+                            if len(concept.split()) > 1]
+        self.auto_corrector.local_phrases = PhraseMatcher(phrases)
         # remove symbols if they appear as tokens
         stop_signs = set(['-', '?', '!', '/', '\\', '"', "'"])
-        self.local_corpus = self.local_corpus.difference(stop_signs)
+        self.local_corpus.difference_update(stop_signs)
 
-    def correct_notes(self, online=False):
-        self.online = online
-        self.get_note_titles()
+    def correct_notes(self, online=None):
+        if online is not None:
+            self.online = online
+        if not self.notes:
+            self.get_note_titles()
         if not self.notes:
            message = "no apunts url found for: %s"%self.title
         for note in self.notes:
@@ -202,21 +444,37 @@ class Bot(object):
         # checks first the new format, only if it doesn't exist checks the old
         new_format = '/'.join([self.title, 'apunts', '01'])
         old_format = '/'.join([self.title, 'apunts'])
-        note_page = pywikibot.Page(self.site, new_format)
-        if note_page.text:
+        note_page, text = self.get_wiki_page(new_format)
+        if text:
             self.notes = [new_format]
         else:
-            note_page = pywikibot.Page(self.site, old_format)
-            if note_page.text:
+            note_page, text = self.get_wiki_page(old_format)
+            if text:
                 self.notes = [old_format]
+        if self.notes:
+            # keep the fetched page to avoid downloading it again
+            self.note_pages[self.notes[0]] = note_page
+
+    def get_wiki_page(self, title):
+        # returns the page and its text, without any request if the page
+        # was preloaded
+        page = self.preloader.get(title) if self.preloader else None
+        if page is None:
+            page = pywikibot.Page(self.site, title)
+            return page, page.text
+        if not page.exists():
+            return page, ''
+        return page, page.text
 
     def correct_note(self, note):
-        note_page = pywikibot.Page(self.site, note)
+        note_page = self.note_pages.get(note)
+        if note_page is None:
+            note_page = pywikibot.Page(self.site, note)
         # TODO extract only the content?
         content = note_page.text
         language = self.get_language(content)
         # TODO send the content to be corrected according to the LT rules
-        return self.correct_content(content, language)
+        return self.correct_content(content, language, note)
 
     def get_language(self, content):
         # TODO currently done in corrector per paragraph
@@ -225,85 +483,100 @@ class Bot(object):
         else:
             return 'ca-ES'
 
-    def correct_content(self, content, language):
+    def correct_content(self, content, language, note=None):
         # TODO to be moved to LT processes class
         # Segments and sends the content to LT according to the
         # public api rate limits
         # http://wiki.languagetool.org/public-http-api
 
-        if os.path.isfile(self.outpath):
-            msg = 'title exists in cache: %s'%self.title
-            print(self.outpath)
+        key = self.get_cache_key(content, language)
+        responses = self.correction_cache.get(key)
+        if responses is not None:
+            msg = 'content of %s exists in cache: %s'%(self.title, key)
             print(msg)
             logging.info(msg)
-            with open(self.outpath) as f:
-                responses = json.load(f)
-            return responses
+            responses['title'] = self.title
         else:
             responses = {'title': self.title, 'results': []}
             if self.online:
-                per_req_size_limit = 6e3 # KB
-                sentences = content.split('. ')
-                requests = []
-                test_chunks = []
-                chunk = []
-                for sentence in sentences:
-                    chunk.append(sentence)
-                    total_chunk = '. '.join(chunk)
-                    if sys.getsizeof(total_chunk) > per_req_size_limit:
-                        requests.append(total_chunk)
-                        test_chunks.append((chunk[0], chunk[-1]))
-                        chunk = []
-                if chunk:
-                    # add last chunk
-                    requests.append('. '.join(chunk))
-                    test_chunks.append((chunk[0], chunk[-1]))
-
-                # send requests to api
-                # TODO smarter rate limit control needed
-                total_requests = len(requests)
-                for i, request in enumerate(requests):
-                    try:
-                        response = api.check(request,
-                                         api_url=self.languagetool,
-                                         lang=language)
-                    # TODO check language, if confidence lower than 0.90 resend
-                    except Exception as e:
-                        msg = "%s language error. Trying to detect the language."\
-                              ""%language
-                        logging.warning(msg)
-                        response = api.check(test_chunks[i][1],
-                                         api_url=self.languagetool,
-                                         lang=language)
-                        language_bottom = response['language']['detectedLanguage']['code']
-                        response = api.check(test_chunks[i][0],
-                                         api_url=self.languagetool,
-                                         lang=language_bottom)
-                        language_top = response['language']['detectedLanguage']['code']
-                        if language != language_top:
-                            language = language_top
-                        else:
-                            language = language_bottom
-                        msg = "%s detected as new language"%language
-                        logging.info(msg)
-                        response = api.check(request,
-                                         api_url=self.languagetool,
-                                         lang=language)
-                    message = '%i/%i response sent'%(i+1, total_requests)
-                    print(message)
-                    logging.info(message)
-                    if i+1 != total_requests:
-                        # wait at all except the last LT api call
-                        time.sleep(4)
-                    responses['results'].append({'content': request,
-                                                   'response': response})
+                scheduler = Scheduler(self.languagetool)
+                requests = chunker.get_requests(content,
+                                                self.get_size_limit(scheduler),
+                                                language)
+
+                # send requests to the api as fast as the rate limits of
+                # the endpoints allow
+                self.total_requests = len(requests)
+                items = list(enumerate(requests))
+                responses['results'] = scheduler.run(self.check_request,
+                                                     items)
             else:
-                chunks = corrector.get_chunks(content)
+                chunks = corrector.get_chunks(content,
+                                              self.declared_language)
                 corrector.correct(chunks, responses)
-
-            with open(self.outpath, 'w') as out:
-                json.dump(responses, out, indent = 2)
-            return responses
+            self.correction_cache.put(key, responses, self.title)
+
+        self.store.save(self.title, note or self.title, responses)
+        return responses
+
+    def get_size_limit(self, scheduler):
+        size_limit = REQUEST_SIZE_LIMIT
+        if scheduler.request_bytes:
+            size_limit = min(size_limit, scheduler.request_bytes)
+        return size_limit
+
+    def get_cache_key(self, content, language):
+        # the responses depend on the content, the language, the version of
+        # LanguageTool and how the content is split and checked
+        if self.online:
+            urls = self.languagetool
+            if type(urls) == str:
+                urls = [urls]
+            scheduler = Scheduler(urls)
+            # the versions reported by the servers, asked once per endpoint
+            version = scheduler.get_version()
+            configuration = {'mode': 'online',
+                             'endpoints': sorted(urls),
+                             'size_limit': self.get_size_limit(scheduler)}
+        else:
+            version = corrector.LT_VERSION
+            configuration = {'mode': 'offline',
+                             'languages': corrector.TEIXIDORA_LANGS,
+                             'declared_language': self.declared_language}
+        return self.correction_cache.get_key(content, language, version,
+                                             configuration)
+
+    async def check_request(self, scheduler, item):
+        i, chunk = item
+        request = chunk.text
+        language = chunk.language
+        # first and last sentences, to detect the language if it fails
+        sentences = [sentence for sentence in request.strip().split('. ')\
+                     if sentence] or [request]
+        test_chunk = (sentences[0], sentences[-1])
+        try:
+            response = await scheduler.check(request, language)
+        # TODO check language, if confidence lower than 0.90 resend
+        except Exception as e:
+            msg = "%s language error. Trying to detect the language."\
+                  ""%language
+            logging.warning(msg)
+            response = await scheduler.check(test_chunk[1], language)
+            language_bottom = response['language']['detectedLanguage']['code']
+            response = await scheduler.check(test_chunk[0], language_bottom)
+            language_top = response['language']['detectedLanguage']['code']
+            if language != language_top:
+                language = language_top
+            else:
+                language = language_bottom
+            msg = "%s detected as new language"%language
+            logging.info(msg)
+            response = await scheduler.check(request, language)
+        message = '%i/%i response received'%(i+1, self.total_requests)
+        print(message)
+        logging.info(message)
+        return {'content': request, 'offset': chunk.offset,
+                'response': response}
 
     def implement_corrections(self):
         self.targets = []
@@ -315,13 +588,20 @@ class Bot(object):
                     final_corrected_content =\
                                    self.auto_corrector.auto_correct(result)
                     result['corrected_content'] = final_corrected_content
+                    result['corrections'] = self.auto_corrector.edits
+                # chunks with offsets are consecutive slices of the note,
+                # older online responses were split at the sentences
+                if all(['offset' in c for c in responses['results']]):
+                    separator = ''
+                else:
+                    separator = '. '
                 target = [url,
-                       '. '.join([c['content'] for c in responses['results']]),
-                       '. '.join([c['corrected_content']\
+                       separator.join([c['content']\
+                                              for c in responses['results']]),
+                       separator.join([c['corrected_content']\
                                               for c in responses['results']])]
                 self.targets.append(target)
-                with open(self.outpath.replace('.json', '_c.json'), 'w') as out:
-                    json.dump(responses, out, indent = 2)
+                self.store.save(self.title, url, responses)
         else:
             msg = 'no corrections found for %s'%self.title
             logging.warning(msg)
@@ -330,56 +610,80 @@ class Bot(object):
         for url, content, corrected_content in self.targets:
             # TODO add labels for revised=False
             # TODO check if correction webpage exists
-            correction_page = pywikibot.Page(self.site, url+'/correccions')
-            correction_page.text = content
-            correction_page.save('BOT - original content imported from %s'%url)
+            correction_page = self.preloader and\
+                              self.preloader.get(url+'/correccions')
+            if not correction_page:
+                correction_page = pywikibot.Page(self.site, url+'/correccions')
+            if self.keep_original:
+                # the original as a revision of its own, otherwise the
+                # differences are in the comparison with the note page
+                correction_page.text = content
+                correction_page.save('BOT - original content imported from'\
+                                     ' %s'%url)
+            logging.info('corrections of %s: %s'%(url, self.get_diff_url(url)))
             correction_page.text = corrected_content
-            correction_page.save('BOT - corrections implemented')
-        self.change_param_value('bot correction', 'Feta')
-        self.change_param_value('human review', 'Pendent')
+            correction_page.save('BOT - corrections of [[%s]] implemented'%url,
+                                 asynchronous=self.asynchronous,
+                                 callback=self.saved)
+        edit = PageEdit(self.page, self.wikicode)
+        edit.set_param('bot correction', 'Feta')
+        edit.set_param('human review', 'Pendent')
+        return self.save_edit(edit)
+
+    def get_diff_url(self, note):
+        # comparison of the original note with its correction page
+        return '%s?%s'%(self.site.base_url(self.site.path()),
+                        urlencode({'title': 'Special:ComparePages',
+                                   'page1': note,
+                                   'page2': note+'/correccions'}))
+
+    def save_edit(self, edit, summary=None):
+        # the revision of the event page is checkpointed once it is saved.
+        # the saved page is the one of the callback, the bot may be on
+        # another page when a queued save is done. returns whether a save
+        # was made or queued
+        def saved(page, error):
+            self.saved(page, error)
+            if error is None:
+                self.store.set_revision(page.title(),
+                                        page.latest_revision_id)
+        return edit.save(summary, asynchronous=self.asynchronous,
+                         callback=saved)
+
+    def saved(self, page, error):
+        # callback of the saves, the failed ones keep the run unfinished
+        if error is not None:
+            msg = '%s not saved: %s'%(page.title(), str(error))
+            logging.error(msg)
+            self.save_errors.append(page.title())
 
     def change_param_value(self, param, new_value):
-        old_value = self.params[param]
-        if old_value:
-            new_text = re.sub('%s=%s'%(param, old_value),
-                              '%s=%s'%(param, new_value),
-                              self.page.text)
-        else:
-            # assumes there is always bot import parameter
-            if self.params["bot import"] == None:
-                msg = "cannot tick checkbox bcs parameter is not in the"\
-                      " template and the anchor parameter bot import"\
-                      " also doesn't exist.\n%s"%self.title
-                logging.error(msg)
-                raise ValueError(msg)
-            else:
-                bi_val = self.params['bot import']
-                new_text = re.sub('bot import=%s\n'%bi_val,
-                                  'bot import=%s\n|%s=%s\n'%(bi_val,
-                                                             param,
-                                                             new_value),
-                                  self.page.text)
-                if self.page.text == new_text:
-                    msg = "parameter not changed, cannot save a new version"\
-                          "\n%s -> %s for %s"%(param, new_value, self.page.title)
-                    print(msg)
-                    logging.warning(msg)
-        self.page.text = new_text
-        self.page.save('BOT - %s parameter changed to %s'%(param, new_value))
+        edit = PageEdit(self.page, self.wikicode)
+        edit.set_param(param, new_value)
+        return self.save_edit(edit)
 
     def replace_corrected_notes(self):
-        self.get_note_titles()
+        if not self.notes:
+            self.get_note_titles()
+        edit = PageEdit(self.page, self.wikicode)
         for note in self.notes:
             correction = note+'/correccions'
-            correction_page = pywikibot.Page(self.site, correction)
-            if correction_page.text:
-                note_page = pywikibot.Page(self.site, note)
-                note_page.text = correction_page.text
-                note_page.save("BOT - manual corrections implemented")
-                self.change_param_value('human review', '')
+            correction_page, correction_text = self.get_wiki_page(correction)
+            if correction_text:
+                note_page = self.note_pages.get(note)
+                if note_page is None:
+                    note_page = pywikibot.Page(self.site, note)
+                note_page.text = correction_text
+                note_page.save("BOT - manual corrections implemented",
+                               asynchronous=self.asynchronous,
+                               callback=self.saved)
+                edit.set_param('human review', '')
             else:
                 logging.warning("%s not found, manual correction cannot"\
-                                " be saved")
+                                " be saved"%correction)
+        if edit.changes:
+            return self.save_edit(edit)
+        return False
 
 if __name__ == "__main__":
     usage = "usage: %(prog)s [options]"
@@ -391,6 +695,25 @@ if __name__ == "__main__":
                         help='host to connect')
     parser.add_argument('-a', '--all', action='store_true',
                         help='correct all the tagged pages')
+    parser.add_argument('-f', '--full', action='store_true',
+                        help='visit all the pages, even the ones not changed'
+                             ' since the last run')
+    parser.add_argument('-k', '--keep-original', action='store_true',
+                        help='save the original notes as a revision of the'
+                             ' correction pages')
+    parser.add_argument('-r', '--refresh', type=float,
+                        help='hours between the refreshes of the global'
+                             ' corpus, 0 disables them (default 24)')
+    parser.add_argument('-n', '--online', action='store_true',
+                        help='correct with the LanguageTool api instead of'
+                             ' the local engines')
+    parser.add_argument('-l', '--languagetool', action='append',
+                        help='LanguageTool api url for the online'
+                             ' corrections, implies -n. can be given several'
+                             ' times to share the online corrections')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of workers per stage (fetch, correct'
+                             ' and save) when correcting all the pages')
     args = parser.parse_args()
 
     logging_level = logging.INFO
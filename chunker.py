@@ -0,0 +1,94 @@
+import re
+
+from collections import namedtuple
+
+# paragraphs, sentences and the wikicode delimiters that should not be split
+RE_BOUNDARIES = re.compile(r'\n|\. |\{\{|\}\}|\[\[|\]\]')
+OPENING = {'{{': '}}', '[[': ']]'}
+CLOSING = {'}}': '{{', ']]': '[['}
+PARAGRAPH = 2
+SENTENCE = 1
+
+# a piece of a note with its language and its character offset in the note
+Chunk = namedtuple('Chunk', ['text', 'language', 'offset'])
+
+def split(content, limit):
+    # yields (start, end) character offsets of consecutive chunks of the
+    # content whose utf8 size is never above limit bytes. chunks end
+    # preferably at a paragraph, otherwise at a sentence, and never inside
+    # a template or a link unless a single unit is larger than the limit.
+    # the content is read once, keeping a running byte count
+    limit = int(limit)
+    if limit < 4:
+        raise ValueError('limit should allow at least one utf8 character')
+    start, start_bytes = 0, 0
+    position, position_bytes = 0, 0
+    # best breaking points (character, byte) found in the current chunk
+    breaks = {PARAGRAPH: None, SENTENCE: None}
+    for kind, end in get_boundaries(content):
+        position_bytes += len(content[position:end].encode('utf8'))
+        position = end
+        while position_bytes-start_bytes > limit:
+            end, end_bytes = get_break(content, start, start_bytes,
+                                       breaks, limit)
+            yield start, end
+            start, start_bytes = end, end_bytes
+            breaks = {k: b if b and b[0] > start else None\
+                      for k, b in breaks.items()}
+        if kind:
+            breaks[kind] = (position, position_bytes)
+    if start < len(content):
+        yield start, len(content)
+
+def get_boundaries(content):
+    # yields (kind, position) after every paragraph and sentence end. the
+    # kind is None inside templates and links, where chunks should not
+    # end, and for the end of the content
+    depth = {'{{': 0, '[[': 0}
+    for match in RE_BOUNDARIES.finditer(content):
+        token = match.group()
+        if token in OPENING:
+            depth[token] += 1
+        elif token in CLOSING:
+            if depth[CLOSING[token]]:
+                depth[CLOSING[token]] -= 1
+        elif any(depth.values()):
+            yield None, match.end()
+        else:
+            yield PARAGRAPH if token == '\n' else SENTENCE, match.end()
+    yield None, len(content)
+
+def get_break(content, start, start_bytes, breaks, limit):
+    # returns where the chunk starting at start should end and its byte
+    # offset. paragraphs are preferred unless they make a too small chunk
+    paragraph = breaks[PARAGRAPH]
+    candidates = [b for b in breaks.values() if b]
+    if paragraph and paragraph[1]-start_bytes >= limit/2:
+        return paragraph
+    elif candidates:
+        return max(candidates)
+    return hard_break(content, start, start_bytes, limit)
+
+def hard_break(content, start, start_bytes, limit):
+    # no paragraph or sentence end fits, cut at the last space within the
+    # limit or, failing that, at the last complete character
+    encoded = content[start:start+limit].encode('utf8')[:limit]
+    text = encoded.decode('utf8', 'ignore')
+    space = text.rfind(' ')
+    if space > 0:
+        text = text[:space+1]
+    return start+len(text), start_bytes+len(text.encode('utf8'))
+
+def get_requests(content, limit, language=None):
+    # returns the chunks of the content to be sent to the api
+    return [Chunk(content[start:end], language, start)\
+            for start, end in split(content, limit)]
+
+def get_offsets(texts, separator_length=1):
+    # prefix sums of the lengths of texts joined by a separator
+    offsets = []
+    offset = 0
+    for text in texts:
+        offsets.append(offset)
+        offset += len(text)+separator_length
+    return offsets
@@ -1,53 +1,148 @@
 import json
-import re
 import os
+import time
+import logging
 
+from concurrent.futures import ThreadPoolExecutor
 from pywikibot.data import api
+from correction_cache import write_atomic
 
 PATH = os.path.abspath(os.path.dirname(__file__))
 cache_filepath = os.path.join(PATH, 'db/global_corpora.json')
+# results per ask request, semantic mediawiki caps it with $smwgQMaxLimit
+PAGE_SIZE = 500
+# keys of global_corpora.json which are not lists of names
+META_KEYS = ['exists', 'stop_words', 'updated']
+# format of the dates in the queries and overlap between refreshes
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S'
+REFRESH_MARGIN = 600 # seconds
+# characters removed from the tokens of the names
+CLEAN_TABLE = str.maketrans('', '', '()-')
 query_reference = {'organizations':
-                   {'query':'[[Has event organizations mentioned::+]]'\
-                            'OR[[Has event organizer::+]]|mainlabel=-|'\
-                            'headers=hide |increase=log|?'\
-                            'Has event organizations mentioned|'\
-                            '?Has event organizer|limit=10000',
+                   {'conditions':['[[Has event organizations mentioned::+]]',
+                                  '[[Has event organizer::+]]'],
+                    'printouts':['Has event organizations mentioned',
+                                 'Has event organizer'],
                     'filter_fields':['Has event organizations mentioned',
                                      'Has event organizer']},
                     'people':
-                     {'query':'[[Has event individuals mentioned::+]]'\
-                              'OR[[Has event speaker::+]]|mainlabel=-|'\
-                              'headers=hide|increase=log|?'\
-                              'Has event individuals mentioned|?'\
-                              'Has event speaker|limit=10000',
+                     {'conditions':['[[Has event individuals mentioned::+]]',
+                                    '[[Has event speaker::+]]'],
+                      'printouts':['Has event individuals mentioned',
+                                   'Has event speaker'],
                       'filter_fields':['Has event individuals mentioned']},
                     'projects':
-                     {'query':'[[Has event projects mentioned::+]]|'\
-                              'mainlabel=-|headers=hide|increase=log|?'\
-                              'Has event projects mentioned|limit=1000',
+                     {'conditions':['[[Has event projects mentioned::+]]'],
+                      'printouts':['Has event projects mentioned'],
                       'filter_fields':['Has event projects mentioned']}}
 
-def get_global_corpora(site):
+def get_global_corpora(site, path=cache_filepath):
+    # the corpora are fetched concurrently and written once when all of
+    # them are complete
+    started = time.time()
     corpora = {}
     exists_dict = {}
-    for corpus_name, corpus_info in query_reference.items():
-        result_list = []
-        results = get_results(site, corpus_info['query'])
-        for event, result in results['query']['results'].items():
-            for filter_field in corpus_info['filter_fields']:
-                for mentioned in result['printouts'][filter_field]:
-                    result_list.append(mentioned['fulltext'])
-                    if mentioned['exists']:
-                        exists_dict[mentioned['fulltext']] = mentioned['fullurl']
-        corpora[corpus_name] = list(set(result_list))
-        corpora['exists'] = exists_dict
-        with open(cache_filepath, 'w') as out:
-            json.dump(corpora, out, indent=2)
+    for corpus_name, (names, exists) in fetch_corpora(site).items():
+        corpora[corpus_name] = sorted(names)
+        exists_dict.update(exists)
+    corpora['exists'] = exists_dict
+    corpora['updated'] = started
+    write_atomic(path, json.dumps(corpora, indent=2))
     return corpora
 
+def refresh_global_corpora(site, corpora, path=cache_filepath):
+    # merges the names of the events modified since the last update into
+    # the corpora and returns the names that were not in them. names no
+    # longer mentioned are only dropped by a full rebuild
+    started = time.time()
+    since = None
+    if corpora.get('updated'):
+        since = time.strftime(TIMESTAMP_FORMAT,
+                              time.gmtime(corpora['updated']-REFRESH_MARGIN))
+    new_names = {}
+    exists_dict = corpora.setdefault('exists', {})
+    for corpus_name, (names, exists) in fetch_corpora(site, since).items():
+        known = set(corpora.get(corpus_name, []))
+        new_names[corpus_name] = sorted(names-known)
+        corpora[corpus_name] = sorted(known|names)
+        exists_dict.update(exists)
+    corpora['updated'] = started
+    write_atomic(path, json.dumps(corpora, indent=2))
+    msg = '%i new names in the global corpora since %s'\
+          ''%(sum([len(n) for n in new_names.values()]), since)
+    logging.info(msg)
+    return new_names
+
+def fetch_corpora(site, since=None):
+    # corpus name -> (names, exists) with the three queries sent at once
+    with ThreadPoolExecutor(max_workers=len(query_reference)) as executor:
+        futures = {corpus_name: executor.submit(get_corpus, site, corpus_info,
+                                                since)\
+                   for corpus_name, corpus_info in query_reference.items()}
+        return {corpus_name: future.result()\
+                for corpus_name, future in futures.items()}
+
+def get_query(corpus_info, since=None):
+    # disjunction of the conditions, restricted to the events modified
+    # after since if given
+    conditions = corpus_info['conditions']
+    if since:
+        conditions = ['%s[[Modification date::>%s]]'%(c, since)\
+                      for c in conditions]
+    printouts = '|'.join(['?'+p for p in corpus_info['printouts']])
+    return '%s|mainlabel=-|headers=hide|%s'%('OR'.join(conditions), printouts)
+
+def get_corpus(site, corpus_info, since=None):
+    names = set()
+    exists = {}
+    for event, result in ask(site, get_query(corpus_info, since)):
+        for filter_field in corpus_info['filter_fields']:
+            for mentioned in result['printouts'].get(filter_field, []):
+                names.add(mentioned['fulltext'])
+                if mentioned['exists']:
+                    exists[mentioned['fulltext']] = mentioned['fullurl']
+    msg = '%i names in %s'%(len(names), ', '.join(corpus_info['filter_fields']))
+    logging.info(msg)
+    return names, exists
+
+def ask(site, query, limit=PAGE_SIZE):
+    # yields the (subject, result) pairs of the query following the offset
+    # continuation of semantic mediawiki, one page of results at a time
+    offset = 0
+    while offset is not None:
+        response = get_results(site, '%s|limit=%i|offset=%i'%(query, limit,
+                                                               offset))
+        results = response.get('query', {}).get('results') or {}
+        # an empty result set comes as a list
+        if isinstance(results, dict):
+            for item in results.items():
+                yield item
+        offset = response.get('query-continue-offset')
+
 def get_results(site, query):
     q = api.Request(site=site, parameters={'action': 'ask', 'query': query})
     return q.submit()
-    
+
+def get_corpus_tokens(corpora):
+    # lowercased tokens and multi-word phrases of the names in the corpora
+    tokens = set()
+    phrases = []
+    for key, name_list in corpora.items():
+        if key not in META_KEYS:
+            for name in name_list:
+                words = name.split()
+                tokens.update([clean_token(n.lower()) for n in words])
+                if len(words) > 1:
+                    phrases.append(name)
+        elif key == 'stop_words':
+            # stop words can be compound
+            for name in name_list:
+                tokens.add(name.lower())
+                if len(name.split()) > 1:
+                    phrases.append(name)
+    # eliminating the empty strings
+    tokens.discard('')
+    return tokens, phrases
+
 def clean_token(token):
-    return re.sub('[()-]','', token)
+    return token.translate(CLEAN_TABLE)
@@ -0,0 +1,157 @@
+import bisect
+
+from collections import deque
+
+class PhraseMatcher(object):
+    # Aho-Corasick automaton finding all the occurrences of a set of
+    # phrases in a single pass over the text. matching is case insensitive
+    # and only whole words count
+    def __init__(self, phrases=()):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.size = 0
+        for phrase in phrases:
+            self.add(phrase)
+        self.build()
+
+    def add(self, phrase):
+        phrase = lower_text(phrase.strip())
+        if not phrase:
+            return
+        state = 0
+        for char in phrase:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto)-1
+            state = self.goto[state][char]
+        if len(phrase) not in self.output[state]:
+            self.output[state].append(len(phrase))
+            self.size += 1
+
+    def build(self):
+        # breadth first computation of the failure links
+        queue = deque(self.goto[0].values())
+        for state in queue:
+            self.fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state]+\
+                                          self.output[self.fail[next_state]]
+
+    def __len__(self):
+        return self.size
+
+    def find(self, text):
+        # yields (start, end) of every phrase found in text
+        if not self.size:
+            return
+        lowered = lower_text(text)
+        state = 0
+        for i, char in enumerate(lowered):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length in self.output[state]:
+                start = i+1-length
+                if is_boundary(lowered, start-1) and is_boundary(lowered, i+1):
+                    yield start, i+1
+
+    def spans(self, text):
+        return Spans(self.find(text))
+
+class Spans(object):
+    # merged sorted intervals answering overlap queries by bisection
+    def __init__(self, spans=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(spans):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def update(self, spans):
+        merged = Spans(list(zip(self.starts, self.ends))+list(spans))
+        self.starts, self.ends = merged.starts, merged.ends
+
+    def overlaps(self, start, end):
+        i = bisect.bisect_right(self.starts, start)-1
+        if i >= 0 and self.ends[i] > start:
+            return True
+        return i+1 < len(self.starts) and self.starts[i+1] < end
+
+class ContentIndex(object):
+    # the lowercased tokens surrounded by whitespace in a text, to know
+    # in constant time if a word appears in it
+    def __init__(self, content):
+        lowered = content.lower()
+        words = lowered.split()
+        self.tokens = set(words[1:-1])
+        # the first and last words count only if surrounded by whitespace
+        starts = lowered[:1].isspace()
+        ends = lowered[-1:].isspace()
+        if len(words) == 1:
+            if starts and ends:
+                self.tokens.add(words[0])
+        elif words:
+            if starts:
+                self.tokens.add(words[0])
+            if ends:
+                self.tokens.add(words[-1])
+        self.normalized = ' %s '%' '.join(words)
+
+    def __contains__(self, phrase):
+        words = phrase.lower().split()
+        if len(words) == 1:
+            return words[0] in self.tokens
+        elif not words:
+            return False
+        return ' %s '%' '.join(words) in self.normalized
+
+class LayeredCorpus(object):
+    # a token belongs to the corpus if it is in any of the layers and not
+    # in the mask. the layers are referenced, not copied, so composing the
+    # global corpus with the tokens of a page costs nothing
+    def __init__(self, layers=(), mask=frozenset()):
+        self.layers = list(layers)
+        self.mask = mask
+
+    def __contains__(self, token):
+        if token in self.mask:
+            return False
+        for layer in self.layers:
+            if token in layer:
+                return True
+        return False
+
+    def __iter__(self):
+        seen = set(self.mask)
+        for layer in self.layers:
+            for token in layer:
+                if token not in seen:
+                    seen.add(token)
+                    yield token
+
+    def add_layer(self, layer):
+        # a new corpus with an extra layer, this one is left untouched
+        return LayeredCorpus(self.layers+[layer], self.mask)
+
+def lower_text(text):
+    # lowercases keeping the length, hence the offsets, of the text
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join([c.lower() if len(c.lower()) == 1 else c for c in text])
+
+def is_boundary(text, i):
+    return i < 0 or i >= len(text) or not text[i].isalnum()
@@ -0,0 +1,147 @@
+import os
+import json
+import mmap
+import bisect
+import logging
+import threading
+
+from array import array
+from corpora_utils import cache_filepath, get_corpus_tokens
+from corpus_matcher import PhraseMatcher
+from correction_cache import write_atomic
+
+PATH = os.path.abspath(os.path.dirname(__file__))
+SNAPSHOT_PATH = os.path.join(PATH, 'cache/global_corpora.snapshot')
+MAGIC = b'CORPUS SNAPSHOT 1\n'
+# snapshots already mapped in this process by path
+SNAPSHOTS = {}
+SNAPSHOTS_LOCK = threading.Lock()
+
+class SortedTable(object):
+    # sorted strings in a buffer, the offsets of the strings followed by
+    # the strings in utf8 ended by newlines. lookups bisect the buffer
+    # without loading it, utf8 keeps the order of the code points
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self, i):
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        start, end = self.offsets[i], self.offsets[i+1]-1
+        return bytes(self.blob[start:end]).decode('utf8')
+
+    def __contains__(self, token):
+        i = bisect.bisect_left(self, token)
+        return i < len(self) and self[i] == token
+
+    def __iter__(self):
+        if not len(self):
+            return iter([])
+        return iter(bytes(self.blob[:-1]).decode('utf8').split('\n'))
+
+    def union(self, *others):
+        return set(self).union(*others)
+
+class CorpusSnapshot(object):
+    # the tokens and phrases of the global corpora mapped read-only, the
+    # processes loading the same file share its memory
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header, start = read_header(self.map)
+        buffer = memoryview(self.map)
+        self.tokens, start = read_table(buffer, start,
+                                        self.header['tokens'])
+        self.phrases, start = read_table(buffer, start,
+                                         self.header['phrases'])
+        self.updated = self.header.get('updated')
+        self.phrase_matcher = None
+        self.lock = threading.Lock()
+
+    def get_phrase_matcher(self):
+        # the automaton of the phrases is built once per snapshot, hence
+        # per version of the corpora, and shared by all the bots
+        with self.lock:
+            if self.phrase_matcher is None:
+                self.phrase_matcher = PhraseMatcher(self.phrases)
+            return self.phrase_matcher
+
+    def is_current(self, source):
+        return self.header['source'] == get_source_id(source)
+
+def load(source=cache_filepath, path=SNAPSHOT_PATH):
+    # returns the snapshot of the source corpora, building it when the
+    # source changed since the last build
+    with SNAPSHOTS_LOCK:
+        snapshot = SNAPSHOTS.get(path)
+        if snapshot is not None and snapshot.is_current(source):
+            return snapshot
+        if snapshot is None and os.path.isfile(path):
+            try:
+                snapshot = CorpusSnapshot(path)
+            except (ValueError, KeyError):
+                msg = 'corrupted corpus snapshot %s'%path
+                logging.warning(msg)
+                snapshot = None
+        if snapshot is None or not snapshot.is_current(source):
+            build(source, path)
+            snapshot = CorpusSnapshot(path)
+        SNAPSHOTS[path] = snapshot
+        return snapshot
+
+def build(source=cache_filepath, path=SNAPSHOT_PATH):
+    source_id = get_source_id(source)
+    with open(source) as f:
+        corpora = json.load(f)
+    tokens, phrases = get_corpus_tokens(corpora)
+    tokens = sorted(tokens)
+    phrases = sorted(set(phrases))
+    header = {'source': source_id,
+              'updated': corpora.get('updated'),
+              'tokens': len(tokens),
+              'phrases': len(phrases)}
+    data = bytearray(MAGIC)
+    data += json.dumps(header).encode('utf8')+b'\n'
+    for strings in [tokens, phrases]:
+        # the offsets start aligned to their item size
+        data += b'\0'*(-len(data)%4)
+        blob, offsets = encode_table(strings)
+        data += offsets.tobytes()+blob
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    write_atomic(path, bytes(data))
+    msg = 'corpus snapshot with %i tokens and %i phrases built from %s'\
+          ''%(len(tokens), len(phrases), source)
+    logging.info(msg)
+
+def get_source_id(source):
+    stat = os.stat(source)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def encode_table(strings):
+    offsets = array('I', [0])
+    blob = bytearray()
+    for string in strings:
+        blob += string.encode('utf8')+b'\n'
+        offsets.append(len(blob))
+    return bytes(blob), offsets
+
+def read_header(buffer):
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a corpus snapshot')
+    end = buffer.find(b'\n', len(MAGIC))
+    header = json.loads(buffer[len(MAGIC):end].decode('utf8'))
+    return header, end+1
+
+def read_table(buffer, start, count):
+    start += -start%4
+    end = start+4*(count+1)
+    offsets = buffer[start:end].cast('I')
+    blob = buffer[end:end+offsets[-1]]
+    return SortedTable(offsets, blob), end+offsets[-1]
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+PATH = os.path.abspath(os.path.dirname(__file__))
+CACHE_PATH = os.path.join(PATH, 'cache/corrections')
+INDEX_NAME = 'index.json'
+MAX_ENTRIES = 5000
+MAX_BYTES = 500e6
+MAX_AGE = 90*24*3600 # seconds
+# reads whose time of use is kept in memory before writing the index
+FLUSH_READS = 100
+# mode of the new files, read once since it can only be read by changing it
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+class CorrectionCache(object):
+    # LanguageTool responses stored by the hash of what produced them:
+    # the content, its language, the LanguageTool version and the
+    # configuration of the checks. the index keeps the size and age of the
+    # entries so that no directory scan is needed
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES,
+                 max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.index_path = os.path.join(path, INDEX_NAME)
+        self.index = {}
+        # reads since the index was last written
+        self.unsaved_reads = 0
+        if os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    self.index = json.load(f)
+            except ValueError:
+                msg = 'corrupted correction cache index, starting empty'
+                logging.warning(msg)
+
+    def get_key(self, content, language, version, configuration):
+        content_hash = hashlib.sha256(content.encode('utf8')).hexdigest()
+        key = json.dumps([content_hash, language, version, configuration],
+                         sort_keys=True)
+        return hashlib.sha256(key.encode('utf8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.index.get(key)
+            if not entry:
+                return None
+            if time.time()-entry['created'] > self.max_age:
+                self.remove(key)
+                self.write_index()
+                return None
+            entry['used'] = time.time()
+            self.unsaved_reads += 1
+            if self.unsaved_reads >= FLUSH_READS:
+                self.write_index()
+        try:
+            with open(os.path.join(self.path, entry['file'])) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            msg = 'correction cache entry %s not readable'%key
+            logging.warning(msg)
+            with self.lock:
+                self.remove(key)
+            return None
+
+    def put(self, key, responses, title=None):
+        data = json.dumps(responses, indent=2)
+        filename = key+'.json'
+        write_atomic(os.path.join(self.path, filename), data)
+        with self.lock:
+            now = time.time()
+            self.index[key] = {'file': filename,
+                               'title': title,
+                               'size': len(data.encode('utf8')),
+                               'created': now,
+                               'used': now}
+            self.evict()
+            self.write_index()
+
+    def evict(self):
+        # drops expired entries, then the least recently used ones until
+        # the cache fits in the limits
+        now = time.time()
+        for key in [k for k, e in self.index.items()\
+                    if now-e['created'] > self.max_age]:
+            self.remove(key)
+        total = sum([e['size'] for e in self.index.values()])
+        by_use = sorted(self.index.items(), key=lambda item: item[1]['used'])
+        for key, entry in by_use:
+            if len(self.index) <= self.max_entries and total <= self.max_bytes:
+                break
+            total -= entry['size']
+            self.remove(key)
+
+    def remove(self, key):
+        entry = self.index.pop(key, None)
+        if entry:
+            try:
+                os.remove(os.path.join(self.path, entry['file']))
+            except OSError:
+                pass
+
+    def flush(self):
+        # writes the times of use of the last reads, so that the least
+        # recently used entries are evicted after a restart as well
+        with self.lock:
+            if self.unsaved_reads:
+                self.write_index()
+
+    def write_index(self):
+        write_atomic(self.index_path, json.dumps(self.index))
+        self.unsaved_reads = 0
+
+def write_atomic(path, data):
+    # writes to a temporary file in the same directory and renames it, so
+    # that readers never see a partial file
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    try:
+        with os.fdopen(fd, mode) as out:
+            out.write(data)
+        # the temporary file is only readable by its owner, the file keeps
+        # the mode it had or the one of a file created by open
+        try:
+            file_mode = os.stat(path).st_mode & 0o7777
+        except OSError:
+            file_mode = 0o666 & ~UMASK
+        os.chmod(tmp_path, file_mode)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
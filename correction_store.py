@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from auto_corrector import LANG_KEYS
+
+PATH = os.path.abspath(os.path.dirname(__file__))
+STORE_PATH = os.path.join(PATH, 'cache/corrections.db')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    note TEXT NOT NULL,
+    language TEXT,
+    updated REAL NOT NULL,
+    UNIQUE (title, note)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    page_id INTEGER NOT NULL REFERENCES pages(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    offset INTEGER,
+    language TEXT,
+    languages TEXT,
+    content TEXT NOT NULL,
+    corrected_content TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+    language TEXT,
+    rule_id TEXT,
+    category_id TEXT,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    replacements TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS corrections (
+    id INTEGER PRIMARY KEY,
+    chunk_id INTEGER NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    original TEXT,
+    replacement TEXT,
+    rule_id TEXT,
+    reason TEXT
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    title TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS pages_title ON pages(title);
+CREATE INDEX IF NOT EXISTS chunks_page ON chunks(page_id);
+CREATE INDEX IF NOT EXISTS matches_chunk ON matches(chunk_id);
+CREATE INDEX IF NOT EXISTS matches_rule ON matches(rule_id);
+CREATE INDEX IF NOT EXISTS matches_language ON matches(language);
+CREATE INDEX IF NOT EXISTS corrections_chunk ON corrections(chunk_id);
+CREATE INDEX IF NOT EXISTS corrections_rule ON corrections(rule_id);
+'''
+
+class CorrectionStore(object):
+    # pages, chunks, LanguageTool matches and implemented corrections in a
+    # sqlite database. every thread gets its own connection and the WAL
+    # journal lets several workers read and write at the same time
+    def __init__(self, path=STORE_PATH, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        connection = self.get_connection()
+        connection.executescript(SCHEMA)
+        migrate(connection)
+
+    def get_connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            self.local.connection = connection
+        return connection
+
+    def save(self, title, note, responses):
+        # replaces everything stored for the note of the page in a single
+        # transaction
+        connection = self.get_connection()
+        results = responses.get('results', [])
+        with connection:
+            connection.execute('DELETE FROM pages WHERE title=? AND note=?',
+                               (title, note))
+            cursor = connection.execute('INSERT INTO pages (title, note,'\
+                                        ' language, updated) VALUES'\
+                                        ' (?, ?, ?, ?)',
+                                        (title, note,
+                                         get_page_language(results),
+                                         time.time()))
+            page_id = cursor.lastrowid
+            matches = []
+            corrections = []
+            for position, result in enumerate(results):
+                languages = get_chunk_languages(result)
+                cursor = connection.execute('INSERT INTO chunks (page_id,'\
+                                            ' position, offset, language,'\
+                                            ' languages, content,'\
+                                            ' corrected_content, metadata)'\
+                                            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                            (page_id, position,
+                                             result.get('offset'),
+                                             get_chunk_language(languages),
+                                             json.dumps(languages),
+                                             result['content'],
+                                             result.get('corrected_content'),
+                                             json.dumps(get_metadata(result))))
+                chunk_id = cursor.lastrowid
+                for match in result['response'].get('matches', []):
+                    matches.append((chunk_id,)+normalize_match(match, result))
+                for edit in result.get('corrections', []):
+                    corrections.append((chunk_id, edit['offset'],
+                                        edit['length'], edit['original'],
+                                        edit['replacement'], edit['rule'],
+                                        edit['reason']))
+            connection.executemany('INSERT INTO matches (chunk_id, language,'\
+                                   ' rule_id, category_id, offset, length,'\
+                                   ' replacements, data) VALUES'\
+                                   ' (?, ?, ?, ?, ?, ?, ?, ?)', matches)
+            connection.executemany('INSERT INTO corrections (chunk_id,'\
+                                   ' offset, length, original, replacement,'\
+                                   ' rule_id, reason) VALUES'\
+                                   ' (?, ?, ?, ?, ?, ?, ?)', corrections)
+        msg = '%s stored with %i matches and %i corrections'\
+              ''%(note, len(matches), len(corrections))
+        logging.info(msg)
+
+    def load(self, title, note):
+        # rebuilds the responses of a note as saved
+        connection = self.get_connection()
+        page = connection.execute('SELECT id FROM pages WHERE title=? AND'\
+                                  ' note=?', (title, note)).fetchone()
+        if not page:
+            return None
+        responses = {'title': title, 'results': []}
+        chunks = connection.execute('SELECT id, offset, content,'\
+                                    ' corrected_content, metadata FROM'\
+                                    ' chunks WHERE page_id=? ORDER BY'\
+                                    ' position', (page[0],)).fetchall()
+        for chunk_id, offset, content, corrected_content, metadata in chunks:
+            metadata = json.loads(metadata or '{}')
+            result = metadata.get('result', {})
+            result['content'] = content
+            result['response'] = metadata.get('response', {})
+            result['response']['matches'] = []
+            if offset is not None:
+                result['offset'] = offset
+            if corrected_content is not None:
+                result['corrected_content'] = corrected_content
+            for row in connection.execute('SELECT data FROM matches WHERE'\
+                                          ' chunk_id=? ORDER BY id',
+                                          (chunk_id,)):
+                result['response']['matches'].append(json.loads(row[0]))
+            result['corrections'] = [dict(zip(['offset', 'length',
+                                               'original', 'replacement',
+                                               'rule', 'reason'], row))\
+                    for row in connection.execute('SELECT offset, length,'\
+                                   ' original, replacement, rule_id, reason'\
+                                   ' FROM corrections WHERE chunk_id=?'\
+                                   ' ORDER BY offset', (chunk_id,))]
+            responses['results'].append(result)
+        return responses
+
+    def get_revision(self, title):
+        # last processed revision of the page
+        row = self.get_connection().execute('SELECT revision FROM revisions'\
+                                            ' WHERE title=?',
+                                            (title,)).fetchone()
+        return row[0] if row else None
+
+    def set_revision(self, title, revision):
+        connection = self.get_connection()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO revisions (title,'\
+                               ' revision, updated) VALUES (?, ?, ?)',
+                               (title, revision, time.time()))
+
+    def start_run(self):
+        connection = self.get_connection()
+        with connection:
+            cursor = connection.execute('INSERT INTO runs (started) VALUES'\
+                                        ' (?)', (time.time(),))
+        return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        connection = self.get_connection()
+        with connection:
+            connection.execute('UPDATE runs SET finished=? WHERE id=?',
+                               (time.time(), run_id))
+
+    def get_last_run(self):
+        # start time of the last run that finished, pages edited after it
+        # need to be visited again
+        row = self.get_connection().execute('SELECT MAX(started) FROM runs'\
+                                            ' WHERE finished IS NOT'\
+                                            ' NULL').fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+def migrate(connection):
+    # the languages of the older stores were stored as given by the
+    # corrections, the langdetect codes of the offline ones comma joined
+    columns = [row[1] for row in connection.execute('PRAGMA'\
+                                                    ' table_info(chunks)')]
+    if 'languages' in columns:
+        return
+    with connection:
+        connection.execute('ALTER TABLE chunks ADD COLUMN languages TEXT')
+        rows = connection.execute('SELECT id, language FROM'\
+                                  ' chunks').fetchall()
+        for chunk_id, language in rows:
+            languages = sorted(set(normalize_language(code)\
+                         for code in (language or '').split(',') if code))
+            connection.execute('UPDATE chunks SET language=?, languages=?'\
+                               ' WHERE id=?',
+                               (get_chunk_language(languages),
+                                json.dumps(languages), chunk_id))
+        for table in ['pages', 'matches']:
+            for code, key in LANG_KEYS.items():
+                if code != key:
+                    connection.execute('UPDATE %s SET language=? WHERE'\
+                                       ' language=?'%table, (key, code))
+
+def get_metadata(result):
+    # what the normalized columns do not keep, e.g. the offline languages
+    # or the detected language of the online responses
+    stored = ['content', 'offset', 'corrected_content', 'corrections',
+              'response']
+    return {'result': {k: v for k, v in result.items() if k not in stored},
+            'response': {k: v for k, v in result['response'].items()\
+                         if k != 'matches'}}
+
+def normalize_language(code):
+    # LanguageTool codes for the langdetect ones of the offline corrections
+    return LANG_KEYS.get(code, code)
+
+def get_chunk_languages(result):
+    # online responses have a language per chunk, offline ones a list
+    language = result['response'].get('language')
+    if language:
+        return [normalize_language(language['code'])]
+    return sorted(set(normalize_language(code)\
+                      for code in result.get('languages') or []))
+
+def get_chunk_language(languages):
+    # the language of the chunk if it has only one
+    return languages[0] if len(languages) == 1 else None
+
+def get_page_language(results):
+    languages = [language for result in results\
+                 for language in get_chunk_languages(result)]
+    if languages:
+        return max(set(languages), key=languages.count)
+    return None
+
+def normalize_match(match, result):
+    # common columns for the online (api) and offline (language_tool_python)
+    # match formats. offsets are relative to the content of the chunk
+    if 'rule' in match:
+        language = normalize_language(result['response']['language']['code'])
+        rule_id = match['rule']['id']
+        category_id = match['rule']['category']['id']
+        offset = match['offset']
+        length = match['length']
+        replacements = [r['value'] for r in match.get('replacements', [])]
+    else:
+        language = normalize_language(match.get('language'))
+        rule_id = match.get('ruleId')
+        category_id = match.get('category')
+        offset = match['offsetInContent']
+        length = match['errorLength']
+        replacements = match.get('replacements', [])
+    return (language, rule_id, category_id, offset, length,
+            json.dumps(replacements), json.dumps(match))
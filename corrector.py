@@ -1,47 +1,173 @@
-import re
+import time
+import atexit
+import logging
+import threading
 
 from language_tool_python import LanguageTool
-from langdetect import detect
+from chunker import Chunk, get_offsets
+from language_id import IDENTIFIER
 
 # known teixidora languages written in langdetect format
 # in order to be able skip erroneously detected languages
 # TODO move to global config
 # TODO should be the same as LANG_KEYS keys
 TEIXIDORA_LANGS = ['en', 'ca', 'es', 'fr']
+# part of the key of the cached corrections, the version of the
+# LanguageTool server downloaded and run by language_tool_python
+try:
+    from language_tool_python import download_lt
+    LT_VERSION = 'LanguageTool-%s'%getattr(download_lt,
+                                           'LTP_DOWNLOAD_VERSION',
+                                           getattr(download_lt,
+                                                   'LATEST_VERSION', None))
+except Exception:
+    LT_VERSION = 'unknown'
+# engines not used for longer than this are checked before being reused
+HEALTH_CHECK_INTERVAL = 60 # seconds
+HEALTH_CHECK_TEXT = 'ok'
 
-def process(title, full_text):
+class EnginePool(object):
+    # keeps one LanguageTool engine (a local java server) per language,
+    # started lazily and shared by all the pages and bots of the process
+    def __init__(self, idle_timeout=None):
+        self.engines = {}
+        self.last_used = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+        self.set_idle_timeout(idle_timeout)
+
+    def set_idle_timeout(self, idle_timeout):
+        # engines idle for longer than idle_timeout seconds are shut down
+        # in the background; None keeps them alive until exit
+        self.idle_timeout = idle_timeout
+        if idle_timeout and not self.reaper:
+            self.reaper = threading.Thread(target=self.reap_forever,
+                                           name='lt-engine-reaper',
+                                           daemon=True)
+            self.reaper.start()
+
+    def get_lock(self, language):
+        with self.lock:
+            if language not in self.locks:
+                self.locks[language] = threading.Lock()
+            return self.locks[language]
+
+    def get(self, language):
+        with self.get_lock(language):
+            engine = self.engines.get(language)
+            last_used = self.last_used.get(language, 0)
+            if engine is not None and\
+               time.time()-last_used > HEALTH_CHECK_INTERVAL and\
+               not self.is_healthy(engine):
+                msg = 'LanguageTool engine for %s not responding, '\
+                      'restarting it'%language
+                logging.warning(msg)
+                self.stop(language)
+                engine = None
+            if engine is None:
+                logging.info('starting LanguageTool engine for %s'%language)
+                engine = LanguageTool(language)
+                self.engines[language] = engine
+            self.last_used[language] = time.time()
+            return engine
+
+    def check(self, language, text):
+        engine = self.get(language)
+        try:
+            return engine.check(text)
+        except Exception as e:
+            # the server might have crashed, restart it and retry once
+            msg = 'LanguageTool engine for %s failed: %s. Restarting it'\
+                  ''%(language, str(e))
+            logging.warning(msg)
+            with self.get_lock(language):
+                if self.engines.get(language) is engine:
+                    self.stop(language)
+            return self.get(language).check(text)
+
+    def is_healthy(self, engine):
+        try:
+            engine.check(HEALTH_CHECK_TEXT)
+        except Exception:
+            return False
+        return True
+
+    def stop(self, language):
+        # expects the language lock to be held by the caller
+        engine = self.engines.pop(language, None)
+        self.last_used.pop(language, None)
+        if engine is not None:
+            try:
+                engine.close()
+            except Exception as e:
+                msg = 'LanguageTool engine for %s not closed cleanly: %s'\
+                      ''%(language, str(e))
+                logging.warning(msg)
+
+    def reap(self):
+        now = time.time()
+        for language in list(self.engines.keys()):
+            with self.get_lock(language):
+                last_used = self.last_used.get(language, now)
+                if self.idle_timeout and now-last_used > self.idle_timeout:
+                    logging.info('stopping idle LanguageTool engine for %s'\
+                                 ''%language)
+                    self.stop(language)
+
+    def reap_forever(self):
+        while self.idle_timeout:
+            time.sleep(min(self.idle_timeout, HEALTH_CHECK_INTERVAL))
+            self.reap()
+
+    def close(self):
+        for language in list(self.engines.keys()):
+            with self.get_lock(language):
+                self.stop(language)
+
+ENGINES = EnginePool()
+atexit.register(ENGINES.close)
+
+def process(title, full_text, language=None):
     response = {'title': title,
                 'results': []}
 
-    chunks = get_chunks(full_text)
+    chunks = get_chunks(full_text, language)
     correct(chunks, response)
     return response
 
-def get_chunks(full_text):
+def get_chunks(full_text, language=None):
+    # splits the text in paragraphs, the offset of each paragraph is its
+    # position in the full text. language is the declared language of the
+    # page in LanguageTool format, used as a prior for the detection
+    paragraphs = full_text.split('\n')
+    prior = language.split('-')[0] if language else None
+    languages = IDENTIFIER.identify(paragraphs, prior)
     chunks = []
-    for paragraph in full_text.split('\n'):
-        short = re.sub('[^\w ]+|\d+|_', '', paragraph)
-        language = 'None'
-        if len(short) > 25 and ' ' in paragraph:
-            language = detect(paragraph)
-        chunks.append((paragraph, language))
+    for paragraph, language, offset in zip(paragraphs, languages,
+                                           get_offsets(paragraphs)):
+        chunks.append(Chunk(paragraph, language, offset))
     return chunks
 
 def correct(chunks, response):
     languages = get_languages(chunks)
-    tools = {}
-    for language in languages:
-        if language in TEIXIDORA_LANGS:
-            tools[language] = LanguageTool(language)
+    tools = [language for language in languages\
+                      if language in TEIXIDORA_LANGS]
+
+    # chunks given as (text, language) tuples get their offsets here
+    if any([len(chunk) < 3 for chunk in chunks]):
+        offsets = get_offsets([chunk[0] for chunk in chunks])
+        chunks = [Chunk(chunk[0], chunk[1], offset)\
+                  for chunk, offset in zip(chunks, offsets)]
 
     results = []
-    for i, chunk in enumerate(chunks):
-        c_language = chunk[1]
-        c_text = chunk[0]
-        chunk_offset = sum([len(chunk[0]) for chunk in chunks[:i]])+i
+    for chunk in chunks:
+        c_language = chunk.language
+        c_text = chunk.text
+        chunk_offset = chunk.offset
         if c_language in TEIXIDORA_LANGS:
             cd_results = []
-            for c_result in tools[c_language].check(c_text):
+            for c_result in ENGINES.check(c_language, c_text):
                 cd_result = c_result.__dict__
                 cd_result['offsetInContent'] = chunk_offset+cd_result['offset']
                 cd_result['language'] = c_language
@@ -50,7 +176,7 @@ def correct(chunks, response):
 
     result = {}
     result['content'] = '\n'.join([chunk[0] for chunk in chunks])
-    result['languages'] = list(tools.keys())
+    result['languages'] = tools
     result['response'] = {}
     result['response']['matches'] = results
     response['results'] = [result]
@@ -0,0 +1,109 @@
+import re
+import hashlib
+import threading
+
+from collections import OrderedDict
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+
+# fixed seed so that the same paragraph always gets the same language
+SEED = 0
+CACHE_SIZE = 100000
+# paragraphs shorter than this are not identified at all
+MIN_LENGTH = 25
+# paragraphs shorter than this with an unsure language take the language
+# of their neighbours if both agree
+SHORT_LENGTH = 100
+CONFIDENCE = 0.8
+# minimum probability for the declared language of the page to win
+PRIOR_PROBABILITY = 0.2
+RE_SHORT = re.compile(r'[^\w ]+|\d+|_')
+
+class LanguageIdentifier(object):
+    def __init__(self, seed=SEED, cache_size=CACHE_SIZE):
+        self.factory = DetectorFactory()
+        self.factory.load_profile(PROFILES_DIRECTORY)
+        self.factory.set_seed(seed)
+        self.cache_size = cache_size
+        # paragraph hash -> list of (language, probability)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def identify(self, paragraphs, prior=None):
+        # returns the langdetect code of each paragraph, or 'None' for the
+        # ones too short to be identified. prior is the declared language
+        # of the page in langdetect format. every distinct paragraph is
+        # identified once and remembered by its hash
+        keys = []
+        found = {}
+        for paragraph in paragraphs:
+            if not self.is_identifiable(paragraph):
+                keys.append(None)
+                continue
+            key = hashlib.md5(paragraph.encode('utf8')).hexdigest()
+            keys.append(key)
+            if key not in found:
+                found[key] = self.lookup(key)
+                if found[key] is None:
+                    found[key] = self.get_probabilities(paragraph)
+                    self.store(key, found[key])
+
+        probabilities = [found[key] if key else None for key in keys]
+        languages = [self.decide(p, prior) if p else 'None'\
+                     for p in probabilities]
+        return self.smooth(paragraphs, languages, probabilities)
+
+    def is_identifiable(self, paragraph):
+        short = RE_SHORT.sub('', paragraph)
+        return len(short) > MIN_LENGTH and ' ' in paragraph
+
+    def get_probabilities(self, paragraph):
+        detector = self.factory.create()
+        detector.append(paragraph)
+        try:
+            return [(l.lang, l.prob) for l in detector.get_probabilities()]
+        except LangDetectException:
+            return []
+
+    def store(self, key, probabilities):
+        with self.lock:
+            self.cache[key] = probabilities
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def lookup(self, key):
+        with self.lock:
+            if key not in self.cache:
+                return None
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+    def decide(self, probabilities, prior=None):
+        if not probabilities:
+            return 'None'
+        language, probability = probabilities[0]
+        if prior and language != prior and probability < CONFIDENCE:
+            for p_language, p_probability in probabilities:
+                if p_language == prior and p_probability >= PRIOR_PROBABILITY:
+                    return prior
+        return language
+
+    def smooth(self, paragraphs, languages, probabilities):
+        # short paragraphs with an unsure language take the language of
+        # the closest identified paragraphs when both of them agree
+        identified = [i for i, language in enumerate(languages)\
+                      if language != 'None']
+        smoothed = list(languages)
+        for j, i in enumerate(identified):
+            if len(paragraphs[i]) >= SHORT_LENGTH or\
+               probabilities[i][0][1] >= CONFIDENCE:
+                continue
+            if j == 0 or j+1 == len(identified):
+                continue
+            previous = languages[identified[j-1]]
+            following = languages[identified[j+1]]
+            if previous == following:
+                smoothed[i] = previous
+        return smoothed
+
+IDENTIFIER = LanguageIdentifier()
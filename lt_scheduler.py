@@ -0,0 +1,242 @@
+import re
+import time
+import random
+import asyncio
+import logging
+import threading
+
+from pylanguagetool import api
+
+# limits of the public LanguageTool api
+# http://wiki.languagetool.org/public-http-api
+PUBLIC_URL = 'https://languagetool.org/api/v2/'
+PUBLIC_LIMITS = {'requests': 20, # per minute
+                 'bytes': 75e3, # per minute
+                 'request_bytes': 20e3,
+                 'concurrency': 2}
+# self-hosted servers are only limited by the number of parallel requests
+DEFAULT_LIMITS = {'requests': None,
+                  'bytes': None,
+                  'request_bytes': None,
+                  'concurrency': 4}
+PERIOD = 60 # seconds
+BACKOFF_BASE = 2 # seconds
+BACKOFF_MAX = 120 # seconds
+RETRIES = 5
+# text of the check that asks the version of a server
+VERSION_TEXT = 'ok'
+RE_RATE_LIMIT = re.compile('429|too many requests|exceeded|rate limit',
+                           re.IGNORECASE)
+
+class TokenBucket(object):
+    # allows capacity units per period, refilled continuously
+    def __init__(self, capacity, period=PERIOD):
+        self.capacity = capacity
+        self.rate = capacity/period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens+(now-self.updated)*self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        # seconds to wait until amount units are available
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0
+        return (amount-self.tokens)/self.rate
+
+    def consume(self, amount):
+        self.refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        self.refill()
+        self.tokens = 0
+
+class Endpoint(object):
+    # a LanguageTool server with its own budget. the budget is shared by
+    # all the threads of the process, hence the lock
+    def __init__(self, url, limits):
+        self.url = url
+        self.limits = limits
+        self.buckets = {}
+        for key in ['requests', 'bytes']:
+            if limits.get(key):
+                self.buckets[key] = TokenBucket(limits[key])
+        self.request_bytes = limits.get('request_bytes')
+        self.concurrency = limits.get('concurrency') or 1
+        self.blocked_until = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        # version of the LanguageTool server, see get_version
+        self.version = None
+        self.version_lock = threading.Lock()
+
+    def delay(self, size):
+        # seconds to wait before a request of size bytes can be sent
+        with self.lock:
+            return self.get_delay(size)
+
+    def reserve(self, size):
+        # consumes the budget if available, otherwise returns the seconds
+        # to wait before trying again
+        with self.lock:
+            wait = self.get_delay(size)
+            if wait > 0:
+                return wait
+            for key, bucket in self.buckets.items():
+                bucket.consume(self.get_amount(key, size))
+            return 0
+
+    def get_delay(self, size):
+        # expects the lock to be held by the caller
+        wait = self.blocked_until-time.monotonic()
+        for key, bucket in self.buckets.items():
+            wait = max(wait, bucket.delay(self.get_amount(key, size)))
+        return max(wait, 0)
+
+    def get_amount(self, key, size):
+        return 1 if key == 'requests' else size
+
+    def fits(self, size):
+        return not self.request_bytes or size <= self.request_bytes
+
+    def penalize(self):
+        # exponential backoff with jitter after a rate limit error
+        with self.lock:
+            self.failures += 1
+            backoff = min(BACKOFF_MAX, BACKOFF_BASE*2**(self.failures-1))
+            backoff *= random.uniform(0.5, 1.5)
+            self.blocked_until = time.monotonic()+backoff
+            for bucket in self.buckets.values():
+                bucket.drain()
+            return backoff
+
+    def succeed(self):
+        with self.lock:
+            self.failures = 0
+
+ENDPOINTS = {}
+ENDPOINTS_LOCK = threading.Lock()
+
+def get_endpoint(url, limits=None):
+    # endpoints are shared per process so that concurrent bots respect
+    # the same budget
+    with ENDPOINTS_LOCK:
+        if url not in ENDPOINTS:
+            if limits is None:
+                if url == PUBLIC_URL:
+                    limits = PUBLIC_LIMITS
+                else:
+                    limits = DEFAULT_LIMITS
+            ENDPOINTS[url] = Endpoint(url, limits)
+        return ENDPOINTS[url]
+
+def get_version(url, check=api.check):
+    # version reported by the LanguageTool server, asked once per endpoint
+    # with a short check within its budget
+    endpoint = get_endpoint(url)
+    with endpoint.version_lock:
+        if endpoint.version is None:
+            size = len(VERSION_TEXT)
+            wait = endpoint.reserve(size)
+            while wait > 0:
+                time.sleep(wait)
+                wait = endpoint.reserve(size)
+            try:
+                response = check(VERSION_TEXT, api_url=url, lang='en-US')
+            except Exception as e:
+                msg = 'version of %s not available: %s'%(url, str(e))
+                logging.warning(msg)
+                return 'unknown'
+            endpoint.version = get_response_version(response)
+        return endpoint.version
+
+def get_response_version(response):
+    software = response.get('software') or {}
+    return software.get('version') or 'unknown'
+
+def is_rate_limited(error):
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    return bool(RE_RATE_LIMIT.search(str(error)))
+
+class Scheduler(object):
+    # sends the requests to the given LanguageTool endpoints as fast as
+    # their budgets allow
+    def __init__(self, urls, check=api.check):
+        if type(urls) == str:
+            urls = [urls]
+        self.endpoints = [get_endpoint(url) for url in urls]
+        # largest request accepted by all the endpoints
+        limits = [e.request_bytes for e in self.endpoints if e.request_bytes]
+        self.request_bytes = min(limits) if limits else None
+        self.check_function = check
+        self.semaphores = None
+
+    def get_version(self):
+        # versions of the servers of all the endpoints
+        return ','.join(['%s=%s'%(endpoint.url,
+                                  get_version(endpoint.url,
+                                              self.check_function))\
+                         for endpoint in sorted(self.endpoints,
+                                                key=lambda e: e.url)])
+
+    def run(self, coroutine_function, items):
+        # runs coroutine_function(scheduler, item) for every item and
+        # returns the results in the order of the items
+        return asyncio.run(self.gather(coroutine_function, items))
+
+    async def gather(self, coroutine_function, items):
+        self.semaphores = {endpoint.url: asyncio.Semaphore(endpoint.concurrency)
+                           for endpoint in self.endpoints}
+        tasks = [coroutine_function(self, item) for item in items]
+        return await asyncio.gather(*tasks)
+
+    async def acquire(self, size):
+        # waits for the endpoint that can take the request the soonest
+        candidates = [e for e in self.endpoints if e.fits(size)]
+        if not candidates:
+            msg = 'request of %i bytes too large for all the endpoints'%size
+            logging.warning(msg)
+            candidates = self.endpoints
+        while True:
+            endpoint = min(candidates, key=lambda e: e.delay(size))
+            wait = endpoint.reserve(size)
+            if wait <= 0:
+                return endpoint
+            await asyncio.sleep(wait)
+
+    async def check(self, text, lang):
+        size = len(text.encode('utf8'))
+        loop = asyncio.get_running_loop()
+        for attempt in range(RETRIES):
+            endpoint = await self.acquire(size)
+            async with self.semaphores[endpoint.url]:
+                try:
+                    response = await loop.run_in_executor(None,
+                                         lambda: self.check_function(text,
+                                                      api_url=endpoint.url,
+                                                      lang=lang))
+                except Exception as e:
+                    if not is_rate_limited(e):
+                        raise
+                    backoff = endpoint.penalize()
+                    msg = 'rate limited by %s, backing off %.1f s'\
+                          ''%(endpoint.url, backoff)
+                    logging.warning(msg)
+                    continue
+            endpoint.succeed()
+            # the servers can be upgraded during a long run
+            if 'software' in response:
+                endpoint.version = get_response_version(response)
+            return response
+        msg = 'request rate limited %i times, giving up'%RETRIES
+        logging.error(msg)
+        raise RuntimeError(msg)
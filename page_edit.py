@@ -0,0 +1,62 @@
+import logging
+import mwparserfromhell
+
+class PageEdit(object):
+    # collects the changes of template parameters of a page and writes all
+    # of them in a single save. new parameters are added after the anchor
+    # parameter, which is assumed to be in the event template
+    def __init__(self, page, wikicode=None, anchor='bot import'):
+        self.page = page
+        if wikicode is None:
+            wikicode = mwparserfromhell.parse(page.text)
+        self.wikicode = wikicode
+        self.anchor = anchor
+        self.changes = []
+
+    def set_param(self, param, value):
+        self.changes.append((param, value))
+
+    def apply(self):
+        # applies the changes to the parsed page and returns the new text
+        for param, value in self.changes:
+            template = self.find_template(param)
+            if template is not None:
+                template.add(param, value)
+                continue
+            template = self.find_template(self.anchor)
+            if template is None:
+                msg = "cannot tick checkbox bcs parameter is not in the"\
+                      " template and the anchor parameter %s also doesn't"\
+                      " exist.\n%s"%(self.anchor, self.page.title())
+                logging.error(msg)
+                raise ValueError(msg)
+            names = [p.name.strip() for p in template.params]
+            i = names.index(self.anchor)
+            if i+1 < len(template.params):
+                template.add(param, value, before=template.params[i+1])
+            else:
+                template.add(param, value)
+        return str(self.wikicode)
+
+    def find_template(self, param):
+        for template in self.wikicode.filter_templates():
+            if template.has(param):
+                return template
+        return None
+
+    def save(self, summary=None, asynchronous=False, callback=None):
+        # saves the page only if the changes modify its text
+        new_text = self.apply()
+        if new_text == self.page.text:
+            msg = "parameters not changed, cannot save a new version"\
+                  "\n%s for %s"%(str(self.changes), self.page.title())
+            logging.warning(msg)
+            return False
+        if not summary:
+            summary = 'BOT - %s'%', '.join(['%s parameter changed to %s'\
+                                            %(param, value)\
+                                            for param, value in self.changes])
+        self.page.text = new_text
+        self.page.save(summary, asynchronous=asynchronous, callback=callback)
+        self.changes = []
+        return True
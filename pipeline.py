@@ -0,0 +1,80 @@
+import queue
+import logging
+import threading
+
+# marks the end of the input of a stage
+STOP = object()
+
+class Pipeline(object):
+    def __init__(self, stages, workers=4, queue_size=None):
+        # stages is an ordered list of (name, function) tuples. each
+        # function receives the item produced by the previous stage and
+        # returns the item for the next one, or None to drop it
+        if workers < 1:
+            msg = 'number of workers should be positive, %i given'%workers
+            logging.error(msg)
+            raise ValueError(msg)
+        self.stages = stages
+        self.workers = workers
+        # bounded queues give the back-pressure: a fast stage blocks
+        # when the following one can not keep up
+        self.queue_size = queue_size or 2*workers
+        self.queues = [queue.Queue(maxsize=self.queue_size)\
+                       for stage in stages]
+        self.counts = {name: 0 for name, function in stages}
+        self.errors = {name: 0 for name, function in stages}
+        self.lock = threading.Lock()
+
+    def run(self, items):
+        threads = []
+        for i, (name, function) in enumerate(self.stages):
+            stage_threads = []
+            for j in range(self.workers):
+                thread = threading.Thread(target=self.work,
+                                          args=(i, name, function),
+                                          name='%s-%i'%(name, j),
+                                          daemon=True)
+                thread.start()
+                stage_threads.append(thread)
+            threads.append(stage_threads)
+
+        try:
+            for item in items:
+                self.queues[0].put(item)
+        finally:
+            # close the stages in order, each one only after the previous
+            # stage has flushed all its items downstream
+            for i, stage_threads in enumerate(threads):
+                for thread in stage_threads:
+                    self.queues[i].put(STOP)
+                for thread in stage_threads:
+                    thread.join()
+
+        msg = 'pipeline finished. processed: %s errors: %s'%(str(self.counts),
+                                                             str(self.errors))
+        logging.info(msg)
+        return self.counts
+
+    def work(self, i, name, function):
+        inbox = self.queues[i]
+        if i+1 < len(self.queues):
+            outbox = self.queues[i+1]
+        else:
+            outbox = None
+        while True:
+            item = inbox.get()
+            if item is STOP:
+                break
+            try:
+                result = function(item)
+            except Exception as e:
+                # a failing page should not stop the rest of the run
+                msg = '%s stage failed for %s: %s'%(name, str(item), str(e))
+                logging.exception(msg)
+                with self.lock:
+                    self.errors[name] += 1
+                continue
+            with self.lock:
+                self.counts[name] += 1
+            if outbox is not None and result is not None:
+                outbox.put(result)
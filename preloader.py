@@ -0,0 +1,79 @@
+import re
+import logging
+import threading
+import pywikibot
+
+from collections import OrderedDict
+from pywikibot import pagegenerators
+
+# titles per api request, the usual limit of the api for bots is 50
+PRELOAD_SIZE = 50
+CACHE_SIZE = 2000
+RE_CORRECTION = re.compile(r'bot correction\s*=\s*(Activar|Feta)')
+# note pages in order of preference, see Bot.get_note_titles
+NOTE_FORMATS = [['apunts', '01'], ['apunts']]
+CORRECTION_SUFFIX = 'correccions'
+
+class Preloader(object):
+    # fetches the event pages and the note and correction pages that will
+    # be needed to process them in batched api requests instead of one
+    # request per page
+    def __init__(self, site, groupsize=PRELOAD_SIZE, cache_size=CACHE_SIZE):
+        self.site = site
+        self.groupsize = groupsize
+        self.cache_size = cache_size
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def preload(self, pages):
+        # yields the given event pages with their text loaded, after
+        # loading the subpages of each group of events
+        group = []
+        for page in pagegenerators.PreloadingGenerator(pages,
+                                                       groupsize=self.groupsize):
+            group.append(page)
+            if len(group) == self.groupsize:
+                self.preload_subpages(group)
+                for event_page in group:
+                    yield event_page
+                group = []
+        if group:
+            self.preload_subpages(group)
+            for event_page in group:
+                yield event_page
+
+    def preload_subpages(self, event_pages):
+        titles = []
+        for page in event_pages:
+            match = RE_CORRECTION.search(page.text or '')
+            if not match:
+                # nothing will be done with the page
+                continue
+            title = page.title()
+            for note_format in NOTE_FORMATS:
+                note = '/'.join([title]+note_format)
+                titles.append(note)
+                if match.group(1) == 'Feta':
+                    titles.append('/'.join([note, CORRECTION_SUFFIX]))
+        if titles:
+            self.fetch(titles)
+
+    def fetch(self, titles):
+        # a single batched query returns the text of the existing pages
+        # and marks the missing ones
+        pages = [pywikibot.Page(self.site, title) for title in titles]
+        msg = 'preloading %i subpages'%len(pages)
+        logging.info(msg)
+        for page in self.site.preloadpages(pages, groupsize=self.groupsize):
+            self.store(page)
+
+    def store(self, page):
+        with self.lock:
+            self.pages[page.title()] = page
+            while len(self.pages) > self.cache_size:
+                self.pages.popitem(last=False)
+
+    def get(self, title):
+        # returns the preloaded page or None if it was not preloaded
+        with self.lock:
+            return self.pages.get(title.replace('_', ' '))
@@ -1,38 +1,175 @@
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import argparse
+import csv
 import json
 import os
+import sys
 import tabulate
 
-def main():
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from correction_store import CorrectionStore, normalize_match
+from correction_cache import CACHE_PATH, INDEX_NAME
+
+def main(args):
+    filters = get_filters(args)
+    if args.cache:
+        error_categories, sub_error_categories = count_cache(args.cache,
+                                                             filters,
+                                                             args.workers)
+    else:
+        error_categories, sub_error_categories = count_store(CorrectionStore(),
+                                                             filters)
+    if args.format == 'json':
+        json.dump({language: {'categories': error_categories[language],
+                              'rules': sub_error_categories[language]}\
+                   for language in sorted(error_categories)},
+                  sys.stdout, indent=2)
+        print()
+    elif args.format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['language', 'level', 'id', 'count', 'percentage'])
+        for level, error_sets in [('category', error_categories),
+                                  ('rule', sub_error_categories)]:
+            for lang, rows in get_rows(error_sets):
+                for i, count, percentage in rows:
+                    writer.writerow([lang, level, i, count,
+                                     '%.2f'%percentage])
+    else:
+        error_sets = get_table(error_categories)
+        sub_error_sets = get_table(sub_error_categories)
+
+def get_filters(args):
+    # the dates are compared with the update time of the stored pages or
+    # the creation time of the cache entries
+    return {'language': args.language,
+            'rule': args.rule,
+            'since': get_timestamp(args.since),
+            'until': get_timestamp(args.until)}
+
+def get_timestamp(date):
+    if not date:
+        return None
+    return datetime.strptime(date, '%Y-%m-%d').timestamp()
+
+def count_store(store, filters):
+    # the counting is done by sqlite, only the totals are read
+    query = 'SELECT m.language, m.category_id, m.rule_id, COUNT(*) FROM'\
+            ' matches m'
+    conditions = []
+    parameters = []
+    if filters['since'] or filters['until']:
+        query += ' JOIN chunks c ON m.chunk_id=c.id JOIN pages p ON'\
+                 ' c.page_id=p.id'
+        if filters['since']:
+            conditions.append('p.updated >= ?')
+            parameters.append(filters['since'])
+        if filters['until']:
+            conditions.append('p.updated < ?')
+            parameters.append(filters['until'])
+    if filters['language']:
+        conditions.append('m.language LIKE ?')
+        parameters.append(filters['language']+'%')
+    if filters['rule']:
+        conditions.append('(m.rule_id = ? OR m.category_id = ?)')
+        parameters += [filters['rule'], filters['rule']]
+    if conditions:
+        query += ' WHERE '+' AND '.join(conditions)
+    query += ' GROUP BY m.language, m.category_id, m.rule_id'
+    rows = store.get_connection().execute(query, parameters)
+    return count_rows(rows)
+
+def count_cache(path, filters, workers=None):
+    # cached LanguageTool responses, one file per entry, counted in
+    # parallel
+    if not os.path.isdir(path):
+        print('%s not found'%path, file=sys.stderr)
+        return {}, {}
+    index = {}
+    if os.path.isfile(os.path.join(path, INDEX_NAME)):
+        with open(os.path.join(path, INDEX_NAME)) as f:
+            index = json.load(f)
+    filenames = []
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith('.json') or filename == INDEX_NAME:
+            continue
+        created = index.get(filename[:-len('.json')], {}).get('created')
+        if created and filters['since'] and created < filters['since']:
+            continue
+        if created and filters['until'] and created >= filters['until']:
+            continue
+        filenames.append(os.path.join(path, filename))
+    counter = Counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_counter in executor.map(count_file, filenames,
+                                         [filters]*len(filenames),
+                                         chunksize=16):
+            counter.update(file_counter)
+    return count_rows([key+(count,) for key, count in counter.items()])
+
+def count_file(filename, filters):
+    # (language, category, rule) -> matches in a cached response
+    counter = Counter()
+    try:
+        with open(filename) as f:
+            responses = json.load(f)
+    except ValueError:
+        return counter
+    for result in responses.get('results', []):
+        for match in result['response'].get('matches', []):
+            language, rule_id, category_id = normalize_match(match,
+                                                             result)[:3]
+            if filters['language'] and\
+               not (language or '').startswith(filters['language']):
+                continue
+            if filters['rule'] and filters['rule'] not in [rule_id,
+                                                           category_id]:
+                continue
+            counter[(language, category_id, rule_id)] += 1
+    return counter
+
+def count_rows(rows):
     error_categories = {}
     sub_error_categories = {}
-    for f in os.listdir('../cache/'):
-        if f.endswith('.json'):
-            res = json.load(open(os.path.join('../cache/',f)))
-            for result in res['results']:
-                language = result['response']['language']['code']
-                if not error_categories.get(language):
-                    error_categories[language] = []
-                    sub_error_categories[language] = []
-                for match in result['response']['matches']:
-                    parent_cat = match['rule']['category']['id']
-                    child_cat = match['rule']['id']
-                    error_categories[language].append(parent_cat)
-                    sub_error_categories[language].append('%s.%s'%(parent_cat,child_cat))
-    error_sets = get_table(error_categories)
-    sub_error_sets = get_table(sub_error_categories)
-
-def get_table(error_categories):
-    error_sets = {}
-    for lang, lists in error_categories.items():
-        error_sets[lang] = Counter(lists)
-
-    for lang, counter in error_sets.items():
+    for language, parent_cat, child_cat, count in rows:
+        if not error_categories.get(language):
+            error_categories[language] = Counter()
+            sub_error_categories[language] = Counter()
+        error_categories[language][parent_cat] += count
+        sub_error_categories[language]['%s.%s'%(parent_cat,child_cat)] += count
+    return error_categories, sub_error_categories
+
+def get_rows(error_sets):
+    # (id, count, percentage) of every language from the most common
+    for lang, counter in sorted(error_sets.items(), key=lambda i: str(i[0])):
+        total = sum(counter.values())
+        yield lang, [(i, count, count / total*100)\
+                     for i, count in counter.most_common()]
+
+def get_table(error_sets):
+    for lang, rows in get_rows(error_sets):
         print(lang)
-        percentages = [(i, counter[i] / sum(counter.values())*100) for i, count in counter.most_common()]
+        percentages = [(i, percentage) for i, count, percentage in rows]
         print(tabulate.tabulate(percentages))
 
     return error_sets
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-l', '--language',
+                        help='only the matches of the languages starting'
+                             ' with it, e.g. ca')
+    parser.add_argument('-r', '--rule',
+                        help='only the matches of a rule or category id')
+    parser.add_argument('-s', '--since', help='from the date, YYYY-MM-DD')
+    parser.add_argument('-u', '--until', help='before the date, YYYY-MM-DD')
+    parser.add_argument('-f', '--format', default='table',
+                        choices=['table', 'csv', 'json'])
+    parser.add_argument('-c', '--cache', nargs='?', const=CACHE_PATH,
+                        help='count the cached LanguageTool responses'
+                             ' instead of the correction store')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='processes reading the cache files')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import corrector
+
+# chunks and offline corrections of synthetic notes of growing size. the
+# LanguageTool engines are replaced by one that returns a match per
+# paragraph, so that the times are the ones of the chunking, the offsets
+# and the responses, which should grow linearly with the paragraphs
+PARAGRAPHS = ["'''10:30h''' Paràgraf sintètic %i d'apunts d'una sessió llarga"
+              " sobre economia social i cooperativisme.",
+              "Párrafo sintético %i de los apuntes de una sesión larga sobre"
+              " economía social y cooperativismo.",
+              "Synthetic paragraph %i of the notes of a long session about"
+              " social economy and cooperatives.",
+              ""]
+# distinct paragraphs, the language of each one is identified once
+VARIANTS = 25
+
+class Match(object):
+    def __init__(self, text):
+        self.ruleId = 'MORFOLOGIK_RULE_CA_ES'
+        self.message = 'Possible spelling mistake found.'
+        # the matched text, to check the offsets in the note
+        self.replacements = [text[3:11]]
+        self.offset = 3
+        self.errorLength = 8
+        self.category = 'TYPOS'
+
+class SyntheticEngines(object):
+    def check(self, language, text):
+        return [Match(text)]
+
+def get_note(n):
+    return '\n'.join([PARAGRAPHS[i%len(PARAGRAPHS)]\
+                      .replace('%i', str(i%VARIANTS)) for i in range(n)])
+
+def main():
+    corrector.ENGINES = SyntheticEngines()
+    # the languages of the distinct paragraphs are identified before timing
+    corrector.get_chunks(get_note(len(PARAGRAPHS)*VARIANTS), 'ca-ES')
+    for n in [6250, 12500, 25000, 50000]:
+        note = get_note(n)
+        start = time.time()
+        chunks = corrector.get_chunks(note, 'ca-ES')
+        chunks_time = time.time()-start
+        start = time.time()
+        response = corrector.correct(chunks, {'title': 'benchmark',
+                                              'results': []})
+        correct_time = time.time()-start
+        matches = response['results'][0]['response']['matches']
+        assert response['results'][0]['content'] == note
+        assert all([note[m['offsetInContent']:\
+                         m['offsetInContent']+m['errorLength']] ==\
+                    m['replacements'][0] for m in matches])
+        print('%i paragraphs, %i matches: get_chunks %.3f s, correct %.3f s,'
+              ' %.1f us per paragraph'%(n, len(matches), chunks_time,
+                                         correct_time,
+                                         (chunks_time+correct_time)/n*1e6))
+
+if __name__ == "__main__":
+    main()
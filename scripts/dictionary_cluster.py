@@ -1,23 +1,78 @@
+import os
 import json
+import math
 import re
+import zlib
+import time
+import hashlib
+import argparse
+import pywikibot
 import unidecode
-import numpy as np
 import mwparserfromhell
 
 from copy import deepcopy
 from datetime import datetime
-from fuzzywuzzy import fuzz
-from sklearn.cluster import DBSCAN
+from functools import lru_cache
+from contextlib import contextmanager
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from rapidfuzz import fuzz, process, utils
 
-def main():
+# names with a token set ratio of at least SIMILARITY are grouped together
+SIMILARITY = 90
+# share of the character trigrams of the smaller name that similar names
+# have in common, used to generate the candidate pairs. the lowest one in
+# the current corpora is 1/3, amzon and amazon
+MIN_OVERLAP = 0.3
+CORPORA = ['organizations', 'projects', 'people']
+# names whose candidates are scored per task of the process pool
+BLOCK_ROWS = 2000
+# names and grams of the corpora loaded by a process of the pool
+WORKER_CORPORA = {}
+RE_PARENTHESES = re.compile(r'\(.+\)')
+# values replaced by the clusters and the time of the update when rendering,
+# marked with a private use character that mwparserfromhell keeps
+MARK = '\ue000'
+CLUSTERS_PLACEHOLDER = MARK+'clusters'+MARK
+TIMESTAMP_PLACEHOLDER = MARK+'timestamp'+MARK
+RE_TIMESTAMP = re.compile(r'(\|\s*Timestamp\s*=)[^|}]*')
+# clusters per Lliguem caps page on average, see get_pages
+PAGE_SIZE = 100
+# wikicode of a Lliguem caps page, the skeleton of the rendered pages
+TEMPLATE_PATH = 'cache/lliguem_caps_projects.wiki'
+# hashes of the last pushed Lliguem caps pages
+HASHES_PATH = 'cache/lliguem_caps_hashes.json'
+
+def main(workers=None, incremental=False, page_size=PAGE_SIZE):
+    timer = Timer()
     # TODO get info directly from teixidora
-    data = json.load(open('db/global_corpora.json'))
-    print('calculating organizations')
-    org_groups, org_keys = cluster(data['organizations'])
-    print('calculating projects')
-    pro_groups, pro_keys = cluster(data['projects'])
-    print('calculating people')
-    ppl_groups, ppl_keys = cluster(data['people'])
+    with timer('load'):
+        data = json.load(open('db/global_corpora.json'))
+        previous = None
+        if incremental and os.path.isfile('cache/cluster_keys.json'):
+            previous = json.load(open('cache/cluster_keys.json'))
+    if previous:
+        print('updating %s'%', '.join(CORPORA))
+        clusters = {}
+        deltas = {}
+        with timer('update'):
+            for corpus in CORPORA:
+                groups, keys, deltas[corpus] = update_clusters(data[corpus],
+                                                     previous.get(corpus, {}))
+                clusters[corpus] = (groups, keys)
+                print('%s: %i new names, %i clusters changed'\
+                      %(corpus, len(deltas[corpus]['added']),
+                        len(deltas[corpus]['changed'])))
+        with open('cache/cluster_delta.json', 'w') as out:
+            json.dump(deltas, out, indent=2)
+    else:
+        print('calculating %s'%', '.join(CORPORA))
+        clusters = cluster_corpora({corpus: data[corpus]\
+                                    for corpus in CORPORA}, workers, timer)
+    org_groups, org_keys = clusters['organizations']
+    pro_groups, pro_keys = clusters['projects']
+    ppl_groups, ppl_keys = clusters['people']
 
     org_groups.sort()
     pro_groups.sort()
@@ -30,16 +85,21 @@ def main():
                    'projects': pro_keys,
                    'people': ppl_keys}
 
-    with open('cache/cluster_lists.json', 'w') as out:
-        json.dump(results, out, indent=2)
-    with open('cache/cluster_keys.json', 'w') as out:
-        json.dump(key_results, out, indent=2)
+    with timer('write'):
+        with open('cache/cluster_lists.json', 'w') as out:
+            json.dump(results, out, indent=2)
+        with open('cache/cluster_keys.json', 'w') as out:
+            json.dump(key_results, out, indent=2)
 
-    new_org_groups, new_org_keys = auto_assign(org_groups)
-    new_org_groups, new_org_keys = order_groups(new_org_groups, data['exists'])
-    new_pro_groups, new_pro_keys = auto_assign(pro_groups)
-    new_pro_groups, new_pro_keys = order_groups(new_pro_groups, data['exists'])
-    new_ppl_groups, new_ppl_keys = order_groups(ppl_groups, data['exists'])
+    with timer('assign'):
+        new_org_groups, new_org_keys = auto_assign(org_groups)
+        new_org_groups, new_org_keys = order_groups(new_org_groups,
+                                                    data['exists'])
+        new_pro_groups, new_pro_keys = auto_assign(pro_groups)
+        new_pro_groups, new_pro_keys = order_groups(new_pro_groups,
+                                                    data['exists'])
+        new_ppl_groups, new_ppl_keys = order_groups(ppl_groups,
+                                                    data['exists'])
 
     new_org_groups.sort()
     new_pro_groups.sort()
@@ -52,38 +112,287 @@ def main():
                    'projects': new_pro_keys,
                    'people': new_ppl_keys}
 
-    with open('cache/auto_cluster_lists.json', 'w') as out:
-        json.dump(results, out, indent=2)
-    with open('cache/auto_cluster_keys.json', 'w') as out:
-        json.dump(key_results, out, indent=2)
+    with timer('write'):
+        with open('cache/auto_cluster_lists.json', 'w') as out:
+            json.dump(results, out, indent=2)
+        with open('cache/auto_cluster_keys.json', 'w') as out:
+            json.dump(key_results, out, indent=2)
+    timer.report()
+
+    dict_wikicode = generate_wikicode(results, page_size)
+
+class Timer(object):
+    # accumulated wall time per stage
+    def __init__(self):
+        self.times = OrderedDict()
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.times[stage] = self.times.get(stage, 0)+time.time()-start
 
-    dict_wikicode = generate_wikicode(results)
+    def report(self):
+        for stage, seconds in self.times.items():
+            print('%-12s %8.2fs'%(stage, seconds))
+
+def cluster_corpora(corpora, workers=None, timer=None):
+    # clusters several corpora at once. the candidate pairs of every corpus
+    # are scored by blocks of rows in a pool of processes, which read the
+    # names from shared memory
+    timer = timer or Timer()
+    names = {}
+    shared = {}
+    pairs = {corpus: [] for corpus in corpora}
+    try:
+        with timer('normalize'):
+            for corpus, data in corpora.items():
+                names[corpus] = [pre_filter(name) for name in data]
+                shared[corpus] = share(names[corpus])
+        with timer('pairs'):
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for corpus, corpus_names in names.items():
+                    for start in range(0, len(corpus_names), BLOCK_ROWS):
+                        end = min(start+BLOCK_ROWS, len(corpus_names))
+                        memory, size = shared[corpus]
+                        future = executor.submit(score_block, memory.name,
+                                                 size, start, end)
+                        futures[future] = corpus
+                for future in as_completed(futures):
+                    pairs[futures[future]] += future.result()
+    finally:
+        for memory, size in shared.values():
+            memory.close()
+            memory.unlink()
+    clusters = {}
+    with timer('connect'):
+        for corpus, data in corpora.items():
+            clusters[corpus] = get_clusters(data, names[corpus],
+                                            pairs[corpus])
+    return clusters
+
+def share(names):
+    # the names separated by null characters in a shared memory block,
+    # returns the block and the size of the data, the block can be larger
+    data = '\0'.join(names).encode('utf8')
+    memory = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    memory.buf[:len(data)] = data
+    return memory, len(data)
+
+def score_block(name, size, start, end):
+    # run in the pool, the names and their grams are loaded once per
+    # process and corpus
+    if name not in WORKER_CORPORA:
+        memory = shared_memory.SharedMemory(name=name)
+        try:
+            names = bytes(memory.buf[:size]).decode('utf8').split('\0')
+        finally:
+            memory.close()
+        WORKER_CORPORA[name] = (names, index_grams(names))
+    names, gram_index = WORKER_CORPORA[name]
+    return get_similar_pairs(names, range(start, end), gram_index)
 
 def cluster(data):
-    similarity_m = calculate_similarity(data)
-    db = DBSCAN(eps=0.1, min_samples=1, metric='precomputed').fit(similarity_m)
+    # groups of names connected by a similarity of at least SIMILARITY,
+    # the clusters DBSCAN(eps=0.1, min_samples=1) found over the dense
+    # distance matrix, numbered in the order of their first name
+    names = [pre_filter(name) for name in data]
+    return get_clusters(data, names, get_similar_pairs(names))
+
+def get_clusters(data, names, pairs):
+    # groups and keys of the connected names. names left empty by the
+    # scorer are not similar even to themselves, DBSCAN labelled them as
+    # noise
+    noise = set([i for i, name in enumerate(names)\
+                 if not utils.default_process(name)])
+    labels = connect(len(names), pairs, noise)
     groups = {}
     keys = {}
-    for group in list(set(db.labels_)):
+    for group in sorted(set(labels)):
         groups[group] = []
-
-    for group, name in zip(db.labels_, data):
+    for group, name in zip(labels, data):
         groups[group].append(name)
-        keys[name] = int(group)
+        keys[name] = group
     # TODO group id -1 (noise) treatment
     return list(groups.values()), keys
 
-def calculate_similarity(data):
-    mm = np.zeros(shape=(len(data),len(data)))
-    for i, org1 in enumerate(data):
-        for j, org2 in enumerate(data):
-            mm[i][j] = distance(org1, org2)
-    return mm
+def get_similar_pairs(names, rows=None, gram_index=None):
+    # scores only the candidate pairs of the blocking stage
+    pairs = []
+    for i, candidates in get_candidates(names, rows=rows,
+                                        gram_index=gram_index):
+        pairs += score_candidates(names, i, candidates)
+    return pairs
+
+def score_candidates(names, i, candidates):
+    pairs = []
+    choices = [names[j] for j in candidates]
+    for choice, score, k in process.extract(names[i], choices,
+                                            scorer=fuzz.token_set_ratio,
+                                            processor=utils.default_process,
+                                            score_cutoff=SIMILARITY-0.5,
+                                            limit=None):
+        # rounded as fuzzywuzzy did
+        if round(score) >= SIMILARITY:
+            pairs.append((i, candidates[k]))
+    return pairs
+
+def get_candidates(names, overlap=MIN_OVERLAP, rows=None, gram_index=None):
+    # yields every name (of rows, all by default) with the larger names
+    # sharing one of its rarest character trigrams. if a pair shares at
+    # least the overlap fraction of the grams of its smaller name, the
+    # prefix of that name is enough to find it
+    grams, frequency, index = gram_index or index_grams(names)
+    for i in range(len(names)) if rows is None else rows:
+        name_grams = grams[i]
+        prefix, required = get_prefix(name_grams, frequency, overlap)
+        found = set()
+        for gram in prefix:
+            found.update(index[gram])
+        # the pairs are found from their smaller name and the ones sharing
+        # less grams are not worth scoring
+        size = len(name_grams)
+        candidates = [j for j in found\
+                      if (len(grams[j]), j) > (size, i) and\
+                         len(name_grams & grams[j]) >= required]
+        if candidates:
+            yield i, sorted(candidates)
+
+def get_prefix(name_grams, frequency, overlap=MIN_OVERLAP):
+    # the rarest grams of a name, enough to find the names sharing the
+    # required number of grams with it
+    ordered = sorted(name_grams, key=lambda gram: (frequency[gram], gram))
+    required = math.ceil(overlap*len(ordered))
+    return ordered[:len(ordered)-required+1], required
+
+def get_new_candidates(names, new, overlap=MIN_OVERLAP, gram_index=None):
+    # like get_candidates but only for the pairs with a new name. the
+    # smaller names are found by their prefixes, which are indexed too
+    grams, frequency, index = gram_index or index_grams(names)
+    prefixes = [get_prefix(name_grams, frequency, overlap)\
+                for name_grams in grams]
+    prefix_index = {}
+    for j, (prefix, required) in enumerate(prefixes):
+        for gram in prefix:
+            prefix_index.setdefault(gram, []).append(j)
+    new = set(new)
+    for i in sorted(new):
+        name_grams = grams[i]
+        prefix, required = prefixes[i]
+        larger = set()
+        for gram in prefix:
+            larger.update(index[gram])
+        smaller = set()
+        for gram in name_grams:
+            smaller.update(prefix_index.get(gram, []))
+        key = (len(name_grams), i)
+        candidates = [j for j in larger if (len(grams[j]), j) > key and\
+                      len(name_grams & grams[j]) >= required]
+        # the pairs of two new names are found from the smaller one
+        candidates += [j for j in smaller if (len(grams[j]), j) < key and\
+                       j not in new and\
+                       len(name_grams & grams[j]) >= prefixes[j][1]]
+        if candidates:
+            yield i, sorted(candidates)
+
+def update_clusters(data, keys):
+    # adds the names not in the previous keys to their clusters, scoring
+    # only the pairs with a new name. returns the groups, the keys and
+    # the delta of the changed clusters. a name matching several clusters
+    # merges them in the one with the lowest key, the names no longer in
+    # the corpus are dropped without splitting their clusters
+    names = [pre_filter(name) for name in data]
+    current = set(data)
+    new = [i for i, name in enumerate(data) if name not in keys]
+    removed = sorted([name for name in keys if name not in current])
+    pairs = []
+    for i, candidates in get_new_candidates(names, new):
+        pairs += score_candidates(names, i, candidates)
+    # the previous clusters are linked through their first member
+    first = {}
+    for i, name in enumerate(data):
+        if name in keys and keys[name] != -1:
+            pairs.append((first.setdefault(keys[name], i), i))
+    noise = set([i for i, name in enumerate(names)\
+                 if not utils.default_process(name)])
+    components = connect(len(names), pairs, noise)
+    labels = {}
+    next_label = max(list(keys.values())+[-1])+1
+    members = {}
+    for i, component in enumerate(components):
+        members.setdefault(component, []).append(i)
+    for component, indices in sorted(members.items()):
+        if component == -1:
+            continue
+        old = sorted(set([keys[data[i]] for i in indices if data[i] in keys]))
+        if old:
+            labels[component] = old[0]
+        else:
+            labels[component] = next_label
+            next_label += 1
+    new_keys = {}
+    groups = {}
+    for i, name in enumerate(data):
+        label = labels.get(components[i], -1)
+        new_keys[name] = label
+        groups.setdefault(label, []).append(name)
+    changed = set([new_keys[data[i]] for i in new])
+    changed.update([keys[name] for name in removed])
+    for name, label in new_keys.items():
+        if name in keys and keys[name] != label:
+            changed.update([keys[name], label])
+    delta = {'changed': {label: groups[label] for label in sorted(changed)\
+                         if label in groups},
+             'removed': sorted([label for label in changed\
+                                if label not in groups]),
+             'added': [data[i] for i in new],
+             'dropped': removed}
+    return [groups[label] for label in sorted(groups)], new_keys, delta
+
+
+def index_grams(names):
+    grams = [get_grams(name) for name in names]
+    frequency = Counter([gram for name_grams in grams for gram in name_grams])
+    index = {}
+    for i, name_grams in enumerate(grams):
+        for gram in name_grams:
+            index.setdefault(gram, []).append(i)
+    return grams, frequency, index
 
-def distance(str1, str2):
-    str1 = pre_filter(str1)
-    str2 = pre_filter(str2)
-    return 1-fuzz.token_set_ratio(str1, str2)/100.
+def get_grams(name, q=3):
+    # character q-grams of the tokens as compared by the scorer, the
+    # shorter tokens count as a gram
+    grams = set()
+    for token in utils.default_process(name).split():
+        if len(token) < q:
+            grams.add(token)
+        grams.update([token[k:k+q] for k in range(len(token)-q+1)])
+    return grams
+
+def connect(size, pairs, noise=()):
+    # union-find of the pairs, returns the component label of every
+    # element numbered in order of appearance, -1 for the noise
+    parents = list(range(size))
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parents[max(root_i, root_j)] = min(root_i, root_j)
+    labels = []
+    roots = {}
+    for i in range(size):
+        if i in noise:
+            labels.append(-1)
+        else:
+            labels.append(roots.setdefault(find(i), len(roots)))
+    return labels
 
 def pre_filter(string):
     new = re.sub('·|\.$','',string)
@@ -97,7 +406,7 @@ def auto_assign(groups):
     new_keys = {}
     for group in groups:
         if len(group) > 1:
-            chars = [len(re.sub('\(.+\)','',g).strip())\
+            chars = [len(RE_PARENTHESES.sub('',g).strip())\
                      for g in list(group)]
             ref += 1
             if max(chars) - min(chars) < 6:
@@ -108,7 +417,7 @@ def auto_assign(groups):
                 # or group into subgroups of equal lengths
                 subgroups = {}
                 for element in group:
-                    length = len(re.sub('\(.+\)','',element).strip())
+                    length = len(RE_PARENTHESES.sub('',element).strip())
                     if not subgroups.get(length):
                         subgroups[length] = []
                     subgroups[length].append(element)
@@ -149,44 +458,97 @@ def order_groups(groups, exists):
             new_keys[name] = i
     return new_groups, new_keys
 
-def generate_wikicode(results):
+def generate_wikicode(results, page_size=PAGE_SIZE, timestamp=None,
+                      template_path=TEMPLATE_PATH):
+    # returns the text of the Lliguem caps page of every entity. the rows
+    # of the clusters are rendered as strings from a skeleton parsed once,
+    # and paged in subpages Key/2, Key/3... unless page_size is 0
     date_format = '%Y/%m/%d %I:%M:%S %p'
+    timestamp = timestamp or datetime.strftime(datetime.now(), date_format)
+    lliguem_caps_key = {'projects': 'Projectes',
+                        'organizations': 'Organitzacions',
+                        'people': 'Persones'}
+    # TODO access teixidora to get the wikicode of teixidora:Lliguem_caps/key
+    # for now get code from text
+    renderer = get_renderer(template_path)
     templates_dict = {}
     for entity, clusters in results.items():
-        # TODO access teixidora to get the wikicode of teixidora:Lliguem_caps/key
-        # for now get code from text
-        template = get_template(entity)
-        empty_row = get_empty_row(template)
+        for page, page_clusters in enumerate(get_pages(clusters,
+                                                       page_size)):
+            key = lliguem_caps_key[entity]
+            if page:
+                key = '%s/%i'%(key, page+1)
+            templates_dict[key] = ''.join(renderer.render(page_clusters,
+                                                          timestamp))
+    return templates_dict
+
+def get_pages(clusters, page_size=PAGE_SIZE):
+    # splits the sorted clusters in pages of page_size clusters on average.
+    # the pages end at the clusters whose first name hashes to a multiple
+    # of page_size and not at fixed positions, so a new or removed cluster
+    # only changes its own page, unless it ends a page, which shifts the
+    # numbers of the following ones
+    if not page_size:
+        return [clusters]
+    pages = [[]]
+    for cluster in clusters:
+        pages[-1].append(cluster)
+        name = cluster[0] if cluster else ''
+        if zlib.crc32(name.encode('utf8'))%page_size == 0:
+            pages.append([])
+    if len(pages) > 1 and not pages[-1]:
+        pages.pop()
+    return pages
 
-        # convert cluster lists to wiki templates
-        row_list = []
+class ClusterRenderer(object):
+    # writes the wikicode of the cluster lists with string builders. the
+    # page and the Nexus element cluster rows are rendered once by
+    # mwparserfromhell with placeholders, which are then replaced by the
+    # names
+    def __init__(self, text):
+        template = mwparserfromhell.parse(text)
+        self.empty_row = get_empty_row(template)
+        template.get(0).get('Clusters').value = CLUSTERS_PLACEHOLDER
+        template.get(0).get('Timestamp').value = TIMESTAMP_PLACEHOLDER
+        self.page = str(template)
+        # row formats by number of names
+        self.rows = {}
+
+    def render(self, clusters, timestamp):
+        # yields the pieces of the page text
+        page = self.page.replace(TIMESTAMP_PLACEHOLDER, timestamp)
+        before, after = page.split(CLUSTERS_PLACEHOLDER)
+        yield before
         for cluster in clusters:
-            current_row = deepcopy(empty_row)
-            current_row.get('Prevalent version').value = '%s\n'%cluster[0]
-            if len(cluster) > 1:
-                for i, element in enumerate(cluster):
-                    if i != 0:
-                        key = "Version {0:0=2d}".format(i+1)
-                        current_row.add(key, element)
-            row_list.append(current_row)
-
-        # clean cluster list and add
-        template.get(0).get('Clusters').value = row_list[0]
-        for row in row_list[1:]:
-            template.get(0).get('Clusters').value.append(row)
-
-        # add timestamp value
-        template.get(0).get('Timestamp').value =\
-                                  datetime.strftime(datetime.now(),date_format)
-        lliguem_caps_key = {'projects': 'Projectes',
-                            'organizations': 'Organitzacions',
-                            'people': 'Persones'}
-        templates_dict[lliguem_caps_key[entity]] = template
-    return templates_dict
+            for piece in self.render_row(cluster):
+                yield piece
+        yield after
+
+    def render_row(self, cluster):
+        # the literal parts are in the even positions of the format, the
+        # positions of the names in the odd ones
+        row = self.get_row(len(cluster))
+        for i, part in enumerate(row):
+            yield cluster[int(part)] if i%2 else part
+
+    def get_row(self, size):
+        if size not in self.rows:
+            row = deepcopy(self.empty_row)
+            row.get('Prevalent version').value = '%s\n'%placeholder(0)
+            for i in range(1, size):
+                key = "Version {0:0=2d}".format(i+1)
+                row.add(key, placeholder(i))
+            self.rows[size] = str(row).split(MARK)
+        return self.rows[size]
 
-def get_template(key):
-    return mwparserfromhell.parse(
-                              open('cache/lliguem_caps_projects.wiki').read())
+def placeholder(i):
+    return '%s%i%s'%(MARK, i, MARK)
+
+@lru_cache(maxsize=None)
+def get_renderer(path=TEMPLATE_PATH):
+    # the template is read and parsed once
+    with open(path) as f:
+        return ClusterRenderer(f.read())
 
 def get_empty_row(template):
     for t in template.filter_templates():
@@ -201,12 +563,51 @@ def get_empty_row(template):
         temp.remove(key)
     return temp
 
-def push_wikicode(bot, template_dict):
+def push_wikicode(bot, template_dict, hashes_path=HASHES_PATH):
+    # saves only the pages whose clusters changed, compared with the hash
+    # of the last pushed version or else with the live page. with paged
+    # lists only the changed subpages are saved
     page = 'teixidora:Lliguem_caps/%s'
-    for key, value in template_dict.items():
-        bot.get_page(page%key)
-        bot.page.text = value
-        bot.page.save('Bot - Lliguem caps %s list update'%key)
+    hashes = {}
+    if os.path.isfile(hashes_path):
+        hashes = json.load(open(hashes_path))
+    try:
+        for key, value in template_dict.items():
+            digest = get_digest(value)
+            if hashes.get(key) == digest:
+                print('%s not changed'%key)
+                continue
+            wiki_page = pywikibot.Page(bot.site, page%key)
+            if wiki_page.exists() and get_digest(wiki_page.text) == digest:
+                print('%s not changed'%key)
+            else:
+                wiki_page.text = value
+                wiki_page.save('Bot - Lliguem caps %s list update'%key)
+            hashes[key] = digest
+    finally:
+        with open(hashes_path, 'w') as out:
+            json.dump(hashes, out, indent=2)
+    for key in hashes:
+        if key not in template_dict:
+            print('WARNING: %s is no longer generated'%(page%key))
+
+def get_digest(text):
+    # hash of the page without the time of the update
+    text = RE_TIMESTAMP.sub(r'\1', str(text))
+    return hashlib.sha256(text.encode('utf8')).hexdigest()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--workers', type=int,
+                        help='processes scoring the names, all the cores by'
+                             ' default')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='only add the new names to the previous'
+                             ' clusters of cache/cluster_keys.json, the'
+                             ' changes are in cache/cluster_delta.json')
+    parser.add_argument('-p', '--page-size', type=int, default=PAGE_SIZE,
+                        help='clusters per Lliguem caps subpage on average,'
+                             ' 0 writes a single page (default %i)'\
+                             %PAGE_SIZE)
+    args = parser.parse_args()
+    main(args.workers, args.incremental, args.page_size)
@@ -2,7 +2,7 @@ import unittest
 import os
 import json
 
-from auto_corrector import AutoCorrector
+from auto_corrector import AutoCorrector, apply_edits, resolve_overlaps
 
 TEST_PATH = os.path.dirname(os.path.realpath(__file__))
 CACHE_FILES_PATH = os.path.join(TEST_PATH, '../cache')
@@ -38,5 +38,28 @@ class AutoCorrectorTestCase(unittest.TestCase):
 
                     # do language checks
                     if lang == 'ca-ES':
-                       pass 
-                
+                       pass
+
+    def test_edits(self):
+        content = 'Parlem de la cooperatva. aqui aqui'
+        matches = [(30, 4, ['aquí']),
+                   (13, 10, ['cooperativa']),
+                   (25, 4, ['aquí', 'aqüi']),
+                   (26, 6, ['overlapping'])]
+        response = {'content': content,
+                    'languages': ['ca'],
+                    'response': {'matches': []}}
+        for offset, length, replacements in matches:
+            response['response']['matches'].append(
+                                      {'offsetInContent': offset,
+                                       'errorLength': length,
+                                       'replacements': replacements,
+                                       'language': 'ca',
+                                       'ruleId': 'MORFOLOGIK_RULE_CA_ES'})
+        corrected_content = self.test_corrector.auto_correct(response)
+        self.assertEqual(corrected_content, 'Parlem de la cooperativa. aquí aquí')
+        edits = self.test_corrector.edits
+        self.assertEqual([e['offset'] for e in edits], [13, 25, 30])
+        self.assertEqual(edits[0]['original'], 'cooperatva')
+        self.assertEqual(apply_edits(content, edits), corrected_content)
+        self.assertEqual(resolve_overlaps(edits[::-1]), edits)
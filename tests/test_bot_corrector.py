@@ -1,10 +1,20 @@
 import unittest
 import os
 import json
+import shutil
 import hashlib
+import tempfile
 import pywikibot
 
+from unittest import mock
+
+import bot
+import lt_scheduler
+
 from bot import Bot
+from lt_scheduler import Scheduler
+from correction_cache import CorrectionCache
+from correction_store import CorrectionStore
 from corrector import process, get_chunks, correct
 from auto_corrector import AutoCorrector
 
@@ -155,18 +165,87 @@ class BotTestCase(unittest.TestCase):
         # TODO send chunks/requests
 
         # check online corrections
-        if os.path.isfile(self.test_bot.outpath):
-            os.remove(self.test_bot.outpath)
         self.test_bot.online = True
         responses = self.test_bot.correct_note(note_title)
         self.assertTrue(responses.get('results') != [])
 
-        # check offline corrections
-        os.remove(self.test_bot.outpath)
+        # check offline corrections, cached apart from the online ones
         self.test_bot.online = False
         responses = self.test_bot.correct_note(note_title)
         self.assertTrue(responses.get('results') != [])
+
+        # the last corrections are kept in the store
+        stored = self.test_bot.store.load(self.test_bot.title, note_title)
+        self.assertEqual(len(stored['results']), len(responses['results']))
         '''
         with open(outjson, 'w') as out:
             json.dump(responses, out, indent = 2)
         '''
+
+class OnlineTestCase(unittest.TestCase):
+    # online corrections through the rate limited scheduler, with a fake
+    # LanguageTool server
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.url = 'http://localhost:8082/v2/'
+        self.requests = []
+        self.test_bot = Bot.__new__(Bot)
+        self.test_bot.title = 'event'
+        self.test_bot.languagetool = [self.url]
+        self.test_bot.online = True
+        self.test_bot.declared_language = 'ca-ES'
+        self.test_bot.notes = ['event/apunts']
+        self.test_bot.note_pages = {'event/apunts':
+                                    mock.Mock(text='Hola mon.\nAdeu mon.')}
+        self.test_bot.corrected_notes = {}
+        self.test_bot.correction_cache = CorrectionCache(\
+                                            os.path.join(self.tmp, 'cache'))
+        self.test_bot.store = CorrectionStore(os.path.join(self.tmp,
+                                                           'test.db'))
+
+    def tearDown(self):
+        self.test_bot.store.close()
+        lt_scheduler.ENDPOINTS.pop(self.url, None)
+        shutil.rmtree(self.tmp)
+
+    def check(self, text, api_url, lang):
+        self.requests.append((text, api_url, lang))
+        return {'software': {'version': '6.4'},
+                'language': {'code': lang},
+                'matches': []}
+
+    def test_correct_notes(self):
+        with mock.patch.object(bot, 'Scheduler',
+                               lambda urls: Scheduler(urls, check=self.check)):
+            self.test_bot.correct_notes()
+        responses = self.test_bot.corrected_notes['event/apunts']
+        self.assertEqual(''.join([r['content']\
+                                  for r in responses['results']]),
+                         'Hola mon.\nAdeu mon.')
+        self.assertTrue(self.requests)
+        self.assertTrue(all([url == self.url\
+                             for text, url, lang in self.requests]))
+
+
+class TemplateCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.page = mock.Mock(text='{{Esdeveniment\n|language=català\n}}',
+                              latest_revision_id=1)
+
+    def tearDown(self):
+        bot.TEMPLATE_CACHE.pop(('cached event', 1), None)
+
+    def get_params(self):
+        test_bot = Bot.__new__(Bot)
+        test_bot.title = 'cached event'
+        test_bot.page = self.page
+        test_bot.get_template_params()
+        return test_bot.template_params
+
+    def test_cached_revision(self):
+        # a known revision is not parsed again
+        parse = mock.Mock(wraps=bot.mwparserfromhell.parse)
+        with mock.patch.object(bot.mwparserfromhell, 'parse', parse):
+            self.assertEqual(self.get_params(), {'language': ['català\n']})
+            self.assertEqual(self.get_params(), {'language': ['català\n']})
+        self.assertEqual(parse.call_count, 1)
@@ -0,0 +1,37 @@
+import unittest
+
+from chunker import split, get_requests
+
+class ChunkerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.content = ("Primer paràgraf. Té dues frases.\n"
+                        "{{Esdeveniment|nom=Una frase. Dins la plantilla}}\n"
+                        "Segon paràgraf amb un [[enllaç. Llarg]] al mig. "
+                        "I una altra frase sobre l'economia col·laborativa.\n"
+                        "Darrer paràgraf") * 20
+
+    def tearDown(self):
+        pass
+
+    def test_split(self):
+        for limit in [20, 60, 100, 500, 6000]:
+            chunks = list(split(self.content, limit))
+            recovered = ''.join([self.content[s:e] for s, e in chunks])
+            self.assertEqual(recovered, self.content)
+            for start, end in chunks:
+                size = len(self.content[start:end].encode('utf8'))
+                self.assertLessEqual(size, limit)
+
+    def test_boundaries(self):
+        for start, end in split(self.content, 100):
+            chunk = self.content[start:end]
+            # chunks never end inside a template or a link
+            self.assertEqual(chunk.count('{{'), chunk.count('}}'))
+            self.assertEqual(chunk.count('[['), chunk.count(']]'))
+
+    def test_get_requests(self):
+        requests = get_requests(self.content, 200, 'ca-ES')
+        for request in requests:
+            offset = request.offset
+            self.assertEqual(request.text,
+                       self.content[offset:offset+len(request.text)])
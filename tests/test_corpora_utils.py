@@ -0,0 +1,66 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+import corpora_utils
+
+def get_results(site, query):
+    # two pages of results for every corpus, the second one is the last
+    offset = int(query.split('|offset=')[1])
+    name = query.split('::')[0].strip('[')
+    field = [f for info in corpora_utils.query_reference.values()\
+             for f in info['filter_fields'] if f in query][0]
+    results = {'Event %s %i'%(name, offset):
+               {'printouts': {field: [{'fulltext': 'Name %i'%offset,
+                                       'exists': offset == 0,
+                                       'fullurl': 'url %i'%offset}]}}}
+    response = {'query': {'results': results}}
+    if offset == 0:
+        response['query-continue-offset'] = 2
+    return response
+
+class CorporaUtilsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'global_corpora.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_ask_pages(self):
+        with mock.patch('corpora_utils.get_results',
+                        side_effect=get_results) as results:
+            items = list(corpora_utils.ask(None, '?Has event organizer',
+                                           limit=2))
+        self.assertEqual(len(items), 2)
+        self.assertEqual(results.call_count, 2)
+
+    def test_global_corpora(self):
+        with mock.patch('corpora_utils.get_results', side_effect=get_results):
+            corpora = corpora_utils.get_global_corpora(None, self.path)
+        self.assertEqual(corpora['projects'], ['Name 0', 'Name 2'])
+        self.assertEqual(corpora['exists'], {'Name 0': 'url 0'})
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), corpora)
+
+    def test_refresh(self):
+        corpora = {'projects': ['Name 0', 'Old name'], 'stop_words': ['cc'],
+                   'exists': {}, 'updated': 1e9}
+        with mock.patch('corpora_utils.get_results',
+                        side_effect=get_results) as results:
+            new_names = corpora_utils.refresh_global_corpora(None, corpora,
+                                                             self.path)
+        for call in results.call_args_list:
+            self.assertIn('[[Modification date::>2001-09-09T01:36:40]]',
+                          call[0][1])
+        self.assertEqual(new_names['projects'], ['Name 2'])
+        self.assertEqual(corpora['projects'], ['Name 0', 'Name 2', 'Old name'])
+        self.assertEqual(corpora['stop_words'], ['cc'])
+        self.assertGreater(corpora['updated'], 1e9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from corpus_matcher import PhraseMatcher, Spans, ContentIndex, LayeredCorpus
+
+class CorpusMatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.content = 'La Fundació Guifi.net i la Xarxa d\'Economia Solidària '\
+                       'van parlar amb Guifi sobre la xarxa oberta. '
+        self.phrases = ['Fundació Guifi.net', "Xarxa d'Economia Solidària",
+                        'xarxa oberta', 'Guifi', 'Economia Solidària de '\
+                        'Catalunya', 'ia Xarxa']
+
+    def tearDown(self):
+        pass
+
+    def test_find(self):
+        matcher = PhraseMatcher(self.phrases)
+        found = [self.content[s:e] for s, e in matcher.find(self.content)]
+        self.assertEqual(found, ['Guifi', 'Fundació Guifi.net',
+                                 "Xarxa d'Economia Solidària", 'Guifi',
+                                 'xarxa oberta'])
+
+    def test_spans(self):
+        spans = Spans([(3, 10), (8, 15), (20, 25)])
+        self.assertTrue(spans.overlaps(14, 16))
+        self.assertTrue(spans.overlaps(16, 21))
+        self.assertFalse(spans.overlaps(15, 20))
+        self.assertFalse(spans.overlaps(0, 3))
+
+    def test_content_index(self):
+        index = ContentIndex(self.content)
+        self.assertIn('fundació', index)
+        self.assertIn('XARXA OBERTA.', index)
+        self.assertNotIn('la', ContentIndex('la casa'))
+        self.assertNotIn('oberta', index)
+
+    def test_layered_corpus(self):
+        global_corpus = LayeredCorpus([set(['guifi', 'xarxa', 'la'])])
+        corpus = LayeredCorpus([set(['pam']), global_corpus], set(['la']))
+        self.assertIn('pam', corpus)
+        self.assertIn('guifi', corpus)
+        self.assertNotIn('la', corpus)
+        self.assertNotIn('casa', corpus)
+        self.assertEqual(sorted(corpus), ['guifi', 'pam', 'xarxa'])
+        refreshed = global_corpus.add_layer(frozenset(['casa']))
+        self.assertIn('casa', refreshed)
+        self.assertNotIn('casa', global_corpus)
@@ -0,0 +1,60 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import corpus_snapshot
+
+from corpora_utils import get_corpus_tokens
+
+class CorpusSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'global_corpora.json')
+        self.path = os.path.join(self.tmp, 'global_corpora.snapshot')
+        self.corpora = {'projects': ['Fundació Guifi.net', 'Pam a Pam',
+                                     'Coop (57)'],
+                        'people': ['Àngels Núñez'],
+                        'stop_words': ['de la'],
+                        'exists': {'Pam a Pam': 'url'},
+                        'updated': 1e9}
+        with open(self.source, 'w') as f:
+            json.dump(self.corpora, f)
+
+    def tearDown(self):
+        corpus_snapshot.SNAPSHOTS.pop(self.path, None)
+        shutil.rmtree(self.tmp)
+
+    def test_load(self):
+        snapshot = corpus_snapshot.load(self.source, self.path)
+        tokens, phrases = get_corpus_tokens(self.corpora)
+        self.assertEqual(set(snapshot.tokens), tokens)
+        self.assertEqual(sorted(snapshot.phrases), sorted(phrases))
+        for token in tokens:
+            self.assertIn(token, snapshot.tokens)
+        for token in ['pam a', 'url', 'núñez ', '', 'zzz']:
+            self.assertNotIn(token, snapshot.tokens)
+        self.assertEqual(snapshot.updated, 1e9)
+        self.assertIs(corpus_snapshot.load(self.source, self.path), snapshot)
+
+    def test_phrase_matcher(self):
+        snapshot = corpus_snapshot.load(self.source, self.path)
+        matcher = snapshot.get_phrase_matcher()
+        self.assertEqual(len(matcher), len(snapshot.phrases))
+        # built once per version of the corpora
+        self.assertIs(corpus_snapshot.load(self.source,
+                                           self.path).get_phrase_matcher(),
+                      matcher)
+
+    def test_rebuild(self):
+        corpus_snapshot.load(self.source, self.path)
+        self.corpora['projects'].append('Som Energia')
+        with open(self.source, 'w') as f:
+            json.dump(self.corpora, f)
+        os.utime(self.source, ns=(0, 0))
+        snapshot = corpus_snapshot.load(self.source, self.path)
+        self.assertIn('energia', snapshot.tokens)
+
+if __name__ == '__main__':
+    unittest.main()
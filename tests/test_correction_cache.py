@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from correction_cache import CorrectionCache, write_atomic
+
+class CorrectionCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = CorrectionCache(self.path, max_entries=3)
+        self.responses = {'title': 'test', 'results': [{'content': 'hola'}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_key(self):
+        key = self.cache.get_key('hola', 'ca-ES', '5.0', {'mode': 'offline'})
+        self.assertEqual(key, self.cache.get_key('hola', 'ca-ES', '5.0',
+                                                 {'mode': 'offline'}))
+        self.assertNotEqual(key, self.cache.get_key('hola!', 'ca-ES', '5.0',
+                                                    {'mode': 'offline'}))
+        self.assertNotEqual(key, self.cache.get_key('hola', 'ca-ES', '5.0',
+                                                    {'mode': 'online'}))
+
+    def test_get_put(self):
+        key = self.cache.get_key('hola', 'ca-ES', '5.0', {})
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, self.responses, 'test')
+        self.assertEqual(self.cache.get(key), self.responses)
+        # a new instance reads the index written by the first one
+        self.assertEqual(CorrectionCache(self.path).get(key), self.responses)
+
+    def test_write_atomic(self):
+        path = os.path.join(self.path, 'shared.json')
+        write_atomic(path, '{}')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~umask)
+        # the mode of an existing file is kept
+        os.chmod(path, 0o644)
+        write_atomic(path, b'[]')
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+        with open(path) as f:
+            self.assertEqual(f.read(), '[]')
+
+    def test_flush(self):
+        keys = [self.cache.get_key(str(i), 'ca-ES', '5.0', {})\
+                for i in range(3)]
+        for key in keys:
+            self.cache.put(key, self.responses)
+        self.cache.get(keys[0])
+        self.cache.flush()
+        # the time of use is kept by the index, the oldest use is evicted
+        cache = CorrectionCache(self.path, max_entries=3)
+        cache.put(cache.get_key('3', 'ca-ES', '5.0', {}), self.responses)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+
+    def test_evict(self):
+        keys = [self.cache.get_key(str(i), 'ca-ES', '5.0', {})\
+                for i in range(5)]
+        for key in keys:
+            self.cache.put(key, self.responses)
+        self.assertEqual(len(self.cache.index), 3)
+        self.assertIsNone(self.cache.get(keys[0]))
+        self.assertEqual(len(os.listdir(self.path)), 4)
+
+    def test_expire(self):
+        key = self.cache.get_key('hola', 'ca-ES', '5.0', {})
+        self.cache.put(key, self.responses)
+        self.cache.index[key]['created'] -= self.cache.max_age+1
+        self.assertIsNone(self.cache.get(key))
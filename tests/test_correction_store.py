@@ -0,0 +1,119 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from correction_store import CorrectionStore, SCHEMA
+
+class CorrectionStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = CorrectionStore(os.path.join(self.path, 'test.db'))
+        self.online = {'title': 'event',
+                       'results': [{'content': 'Hola mon. ',
+                                    'offset': 0,
+                                    'response': {'language': {'code': 'ca-ES'},
+                                                 'matches': [{'offset': 5,
+                                                  'length': 3,
+                                                  'replacements': [{'value': 'món'}],
+                                                  'rule': {'id': 'MORFOLOGIK_RULE_CA_ES',
+                                                           'category': {'id': 'TYPOS'}}}]}}]}
+        self.offline = {'title': 'event',
+                        'results': [{'content': 'Hola mon.',
+                                     'languages': ['ca'],
+                                     'response': {'matches': [{'offset': 5,
+                                                   'offsetInContent': 5,
+                                                   'errorLength': 3,
+                                                   'replacements': ['món'],
+                                                   'ruleId': 'MORFOLOGIK_RULE_CA_ES',
+                                                   'category': 'TYPOS',
+                                                   'language': 'ca'}]}}]}
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.path)
+
+    def test_save_load(self):
+        for responses in [self.online, self.offline]:
+            self.store.save('event', 'event/apunts', responses)
+            loaded = self.store.load('event', 'event/apunts')
+            self.assertEqual(loaded['results'][0]['content'],
+                             responses['results'][0]['content'])
+            self.assertEqual(loaded['results'][0]['response']['matches'],
+                             responses['results'][0]['response']['matches'])
+        connection = self.store.get_connection()
+        rows = connection.execute('SELECT language, rule_id, category_id,'\
+                                  ' offset FROM matches').fetchall()
+        self.assertEqual(rows, [('ca-ES', 'MORFOLOGIK_RULE_CA_ES', 'TYPOS', 5)])
+
+    def test_languages(self):
+        # the same language code for the online and offline corrections
+        self.offline['results'].append({'content': 'Hola. Hello.',
+                                        'languages': ['en', 'ca'],
+                                        'response': {'matches': []}})
+        self.store.save('event', 'event/online', self.online)
+        self.store.save('event', 'event/offline', self.offline)
+        connection = self.store.get_connection()
+        rows = connection.execute('SELECT p.note, c.language, c.languages'\
+                                  ' FROM chunks c JOIN pages p ON'\
+                                  ' c.page_id=p.id ORDER BY c.id').fetchall()
+        self.assertEqual(rows, [('event/online', 'ca-ES', '["ca-ES"]'),
+                                ('event/offline', 'ca-ES', '["ca-ES"]'),
+                                ('event/offline', None,
+                                 '["ca-ES", "en-US"]')])
+        rows = connection.execute('SELECT DISTINCT language FROM'\
+                                  ' matches').fetchall()
+        self.assertEqual(rows, [('ca-ES',)])
+
+    def test_migrate(self):
+        path = os.path.join(self.path, 'old.db')
+        connection = sqlite3.connect(path)
+        connection.executescript(SCHEMA.replace('    languages TEXT,\n', ''))
+        connection.execute("INSERT INTO pages VALUES (1, 'event',"\
+                           " 'event/apunts', 'ca', 0)")
+        connection.execute("INSERT INTO chunks (id, page_id, position,"\
+                           " language, content) VALUES (1, 1, 0, 'ca,en',"\
+                           " 'Hola. Hello.')")
+        connection.execute("INSERT INTO matches (chunk_id, language, offset,"\
+                           " length) VALUES (1, 'en', 0, 4)")
+        connection.commit()
+        connection.close()
+        store = CorrectionStore(path)
+        connection = store.get_connection()
+        self.assertEqual(connection.execute('SELECT language, languages FROM'\
+                                            ' chunks').fetchall(),
+                         [(None, '["ca-ES", "en-US"]')])
+        self.assertEqual(connection.execute('SELECT language FROM'\
+                                            ' matches').fetchall(),
+                         [('en-US',)])
+        self.assertEqual(connection.execute('SELECT language FROM'\
+                                            ' pages').fetchall(),
+                         [('ca-ES',)])
+        store.close()
+
+    def test_corrections(self):
+        self.online['results'][0]['corrected_content'] = 'Hola món. '
+        self.online['results'][0]['corrections'] = [{'offset': 5,
+                                                     'length': 3,
+                                                     'original': 'mon',
+                                                     'replacement': 'món',
+                                                     'rule': 'MORFOLOGIK_RULE_CA_ES',
+                                                     'reason': 'single'}]
+        self.store.save('event', 'event/apunts', self.online)
+        loaded = self.store.load('event', 'event/apunts')
+        self.assertEqual(loaded['results'][0], self.online['results'][0])
+        self.assertIsNone(self.store.load('event', 'other'))
+
+    def test_checkpoints(self):
+        self.assertIsNone(self.store.get_revision('event'))
+        self.store.set_revision('event', 10)
+        self.store.set_revision('event', 12)
+        self.assertEqual(self.store.get_revision('event'), 12)
+
+        self.assertIsNone(self.store.get_last_run())
+        run_id = self.store.start_run()
+        # a crashed run does not count
+        self.assertIsNone(self.store.get_last_run())
+        self.store.finish_run(run_id)
+        self.assertIsNotNone(self.store.get_last_run())
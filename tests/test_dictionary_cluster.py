@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import zlib
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../scripts'))
+import dictionary_cluster
+
+TEMPLATE = """{{Lliguem caps
+|Clusters={{Nexus element cluster
+|Prevalent version=Name
+|Version 02=Other name
+}}
+|Timestamp=2020/01/01 10:00:00 AM
+}}
+"""
+
+class DictionaryClusterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.template_path = os.path.join(self.tmp, 'lliguem_caps.wiki')
+        with open(self.template_path, 'w') as f:
+            f.write(TEMPLATE)
+        self.hashes_path = os.path.join(self.tmp, 'hashes.json')
+        self.clusters = sorted([['Name %03i'%i, 'Name %03i bis'%i]\
+                                for i in range(300)])
+        self.page_size = 20
+        self.saved = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def generate(self, clusters, timestamp):
+        return dictionary_cluster.generate_wikicode({'projects': clusters},
+                                               self.page_size, timestamp,
+                                               self.template_path)
+
+    def push(self, pages):
+        saved = self.saved
+        class Page(object):
+            def __init__(self, site, title):
+                self.title = title
+                self.text = ''
+            def exists(self):
+                return False
+            def save(self, summary):
+                saved.append(self.title)
+        with mock.patch.object(dictionary_cluster.pywikibot, 'Page', Page):
+            dictionary_cluster.push_wikicode(mock.Mock(), pages,
+                                             self.hashes_path)
+
+    def test_get_pages(self):
+        pages = dictionary_cluster.get_pages(self.clusters, self.page_size)
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(sum(pages, []), self.clusters)
+        self.assertEqual(dictionary_cluster.get_pages(self.clusters, 0),
+                         [self.clusters])
+        self.assertEqual(dictionary_cluster.get_pages([], self.page_size),
+                         [[]])
+
+    def test_push_changed_cluster(self):
+        pages = self.generate(self.clusters, '2020/01/01 10:00:00 AM')
+        self.push(pages)
+        self.assertEqual(len(self.saved), len(pages))
+
+        # only the subpage of a changed cluster is saved again
+        self.saved = []
+        clusters = [list(cluster) for cluster in self.clusters]
+        clusters[150].append('Name 150 ter')
+        changed = self.generate(clusters, '2020/01/02 10:00:00 AM')
+        self.push(changed)
+        self.assertEqual(len(self.saved), 1)
+
+        # a new cluster which doesn't end a page doesn't move the others
+        self.saved = []
+        name = [name for name in ('Name %03i new'%i for i in range(300))\
+                if zlib.crc32(name.encode('utf8'))%self.page_size][0]
+        clusters = sorted(clusters+[[name]])
+        self.push(self.generate(clusters, '2020/01/03 10:00:00 AM'))
+        self.assertEqual(len(self.saved), 1)
+        with open(self.hashes_path) as f:
+            self.assertEqual(sorted(json.load(f)), sorted(pages))
+
+if __name__ == '__main__':
+    unittest.main()
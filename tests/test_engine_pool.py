@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+import corrector
+from corrector import EnginePool
+
+class FakeLanguageTool(object):
+    started = 0
+
+    def __init__(self, language):
+        FakeLanguageTool.started += 1
+        self.language = language
+        self.crashed = False
+        self.closed = False
+
+    def check(self, text):
+        if self.crashed:
+            raise ConnectionError('server down')
+        return [text]
+
+    def close(self):
+        self.closed = True
+
+class EnginePoolTestCase(unittest.TestCase):
+    def setUp(self):
+        FakeLanguageTool.started = 0
+        self.patcher = mock.patch.object(corrector, 'LanguageTool',
+                                         FakeLanguageTool)
+        self.patcher.start()
+        self.pool = EnginePool()
+
+    def tearDown(self):
+        self.pool.close()
+        self.patcher.stop()
+
+    def test_reuse(self):
+        for i in range(3):
+            self.pool.check('ca', 'text')
+        self.pool.check('en', 'text')
+        self.assertEqual(FakeLanguageTool.started, 2)
+
+    def test_restart(self):
+        engine = self.pool.get('ca')
+        engine.crashed = True
+        self.assertEqual(self.pool.check('ca', 'text'), ['text'])
+        self.assertTrue(engine.closed)
+        self.assertIsNot(self.pool.get('ca'), engine)
+
+    def test_idle(self):
+        engine = self.pool.get('ca')
+        self.pool.idle_timeout = 10
+        self.pool.last_used['ca'] -= 20
+        self.pool.reap()
+        self.assertTrue(engine.closed)
+        self.assertNotIn('ca', self.pool.engines)
@@ -0,0 +1,33 @@
+import unittest
+
+from language_id import LanguageIdentifier
+
+class LanguageIdentifierTestCase(unittest.TestCase):
+    def setUp(self):
+        self.paragraphs = ["'''MOBILE SOCIAL CONGRESS'''",
+                           '',
+                           "El govern no ha volgut regular la mineria artesanal. La cadena de subministrament cal conèixer-la.",
+                           "Perspectiva desde el lab, lo \"lab\" y los sistemas de innovación. Una ínfima minoría de la población innova mientras que el resto consume.",
+                           'DEMOCRATIC REPUBLIC OF CONGO: HUMAN RIGHTS ABUSES IN THE DEMOCRATIC REPUBLIC OF THE CONGO POWER THE GLOBAL TRADE IN COBALT']
+
+    def tearDown(self):
+        pass
+
+    def test_identify(self):
+        identifier = LanguageIdentifier()
+        languages = identifier.identify(self.paragraphs)
+        self.assertEqual(languages, ['None', 'None', 'ca', 'es', 'en'])
+        self.assertEqual(len(identifier.cache), 3)
+
+    def test_deterministic(self):
+        languages = LanguageIdentifier().identify(self.paragraphs*5)
+        for i in range(3):
+            self.assertEqual(LanguageIdentifier().identify(self.paragraphs*5),
+                             languages)
+
+    def test_prior(self):
+        identifier = LanguageIdentifier()
+        probabilities = [('it', 0.6), ('ca', 0.4)]
+        self.assertEqual(identifier.decide(probabilities), 'it')
+        self.assertEqual(identifier.decide(probabilities, 'ca'), 'ca')
+        self.assertEqual(identifier.decide([('es', 0.99)], 'ca'), 'es')
@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+
+import lt_scheduler
+from lt_scheduler import TokenBucket, Scheduler, get_endpoint, is_rate_limited
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.url = 'http://localhost:8081/v2/'
+        get_endpoint(self.url, {'requests': 600, 'bytes': None,
+                                'request_bytes': 100, 'concurrency': 2})
+
+    def tearDown(self):
+        lt_scheduler.ENDPOINTS.pop(self.url, None)
+
+    def check(self, text, api_url, lang):
+        self.calls.append((text, api_url, lang))
+        if len(self.calls) == 2:
+            raise ValueError('Error: 429 Too Many Requests')
+        return {'text': text}
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(20, period=60)
+        self.assertEqual(bucket.delay(20), 0)
+        bucket.consume(20)
+        self.assertAlmostEqual(bucket.delay(1), 3, places=1)
+
+    def test_rate_limit(self):
+        self.assertTrue(is_rate_limited(ValueError('429 Too Many Requests')))
+        self.assertFalse(is_rate_limited(ValueError('Unknown language')))
+
+    @mock.patch.object(lt_scheduler, 'BACKOFF_BASE', 0.01)
+    def test_run(self):
+        async def send(scheduler, text):
+            return await scheduler.check(text, 'ca-ES')
+        texts = ['text %i'%i for i in range(5)]
+        scheduler = Scheduler(self.url, check=self.check)
+        results = scheduler.run(send, texts)
+        self.assertEqual([r['text'] for r in results], texts)
+        # the rate limited request is sent again
+        self.assertEqual(len(self.calls), len(texts)+1)
+
+    def test_get_version(self):
+        versions = ['6.3', '6.4']
+        def check(text, api_url, lang):
+            self.calls.append((text, api_url, lang))
+            return {'software': {'name': 'LanguageTool',
+                                 'version': versions[len(self.calls)-1]}}
+        scheduler = Scheduler(self.url, check=check)
+        self.assertEqual(scheduler.get_version(), '%s=6.3'%self.url)
+        # asked once per endpoint
+        self.assertEqual(scheduler.get_version(), '%s=6.3'%self.url)
+        self.assertEqual(len(self.calls), 1)
+        # and updated by the responses
+        async def send(scheduler, text):
+            return await scheduler.check(text, 'ca-ES')
+        scheduler.run(send, ['text'])
+        self.assertEqual(scheduler.get_version(), '%s=6.4'%self.url)
@@ -0,0 +1,51 @@
+import unittest
+
+from page_edit import PageEdit
+
+TEXT = '''{{Esdeveniment
+|títol=Una xerrada
+|bot import=Sí
+|bot correction=Activar
+|data=2019
+}}'''
+
+class FakePage(object):
+    def __init__(self, text):
+        self.text = text
+        self.saves = []
+
+    def title(self):
+        return 'Esdeveniment'
+
+    def save(self, summary, asynchronous=False, callback=None):
+        self.saves.append(summary)
+        if callback:
+            callback(self, None)
+
+class PageEditTestCase(unittest.TestCase):
+    def test_single_save(self):
+        page = FakePage(TEXT)
+        edit = PageEdit(page)
+        edit.set_param('bot correction', 'Feta')
+        edit.set_param('human review', 'Pendent')
+        self.assertTrue(edit.save())
+        self.assertEqual(len(page.saves), 1)
+        self.assertIn('|bot correction=Feta\n', page.text)
+        self.assertIn('|bot import=Sí\n|human review=Pendent\n|bot correction',
+                      page.text)
+
+    def test_unchanged(self):
+        page = FakePage(TEXT)
+        edit = PageEdit(page)
+        edit.set_param('bot correction', 'Activar')
+        self.assertFalse(edit.save())
+        self.assertEqual(page.saves, [])
+
+    def test_missing_anchor(self):
+        page = FakePage('{{Esdeveniment\n|títol=Una xerrada\n}}')
+        edit = PageEdit(page)
+        edit.set_param('human review', 'Pendent')
+        self.assertRaises(ValueError, edit.apply)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import threading
+
+from pipeline import Pipeline
+
+class PipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.items = list(range(100))
+
+    def tearDown(self):
+        pass
+
+    def test_run(self):
+        results = []
+        lock = threading.Lock()
+        def collect(item):
+            with lock:
+                results.append(item)
+        stages = [('double', lambda item: item*2),
+                  ('odd', lambda item: item if item%4 else None),
+                  ('collect', collect)]
+        counts = Pipeline(stages, workers=3).run(iter(self.items))
+        self.assertEqual(sorted(results),
+                         [i*2 for i in self.items if (i*2)%4])
+        self.assertEqual(counts['double'], len(self.items))
+        self.assertEqual(counts['collect'], len(results))
+
+    def test_errors(self):
+        def fail(item):
+            if item == 3:
+                raise ValueError('broken page')
+            return item
+        pipeline = Pipeline([('fail', fail), ('pass', lambda item: item)],
+                            workers=2, queue_size=1)
+        counts = pipeline.run(self.items)
+        self.assertEqual(pipeline.errors['fail'], 1)
+        self.assertEqual(counts['pass'], len(self.items)-1)